@@ -24,6 +24,14 @@ from social_events import events_bp
 from social_events import posts_bp
 from social_reactions import reactions_bp
 from pet_characteristics import pet_characteristics_bp
+from presence import presence_bp
+from cleanup_jobs import jobs_bp
+from social_graph import graph_rebuilder
+from rsvp_counters import rsvp_rollup_flusher
+from notifications import notifications_bp, init_notifications
+from session_bootstrap import bootstrap_bp
+from batch_api import batch_bp
+from data_access import init_data_access
 
 # ---- Shop Blueprints (use absolute imports!) ----
 from shop_backend.products import products_bp
@@ -56,6 +64,16 @@ CORS(app, origins=[
 ], supports_credentials=True)
 
 # ---- Initialize Socket.IO ----
+# A room emit only reaches clients connected to the current process. When
+# running more than one gunicorn worker or instance, set SOCKETIO_MESSAGE_QUEUE
+# so emits are published to every node:
+#   redis://localhost:6379/0   -> shared Redis (see docker-compose.yml)
+#   memory://                  -> in-process kombu queue, handy for tests
+# Polling transports keep their Engine.IO session in the process that opened
+# it, so the load balancer must use sticky sessions (nginx ip_hash or a cookie
+# affinity rule) and each gunicorn process should run a single worker, e.g.
+#   gunicorn -k gthread --threads 50 -w 1 app:app   (one per port/instance)
+# Clients that connect with transports=['websocket'] avoid the requirement.
 socketio = SocketIO(
     app,
     cors_allowed_origins=[
@@ -68,7 +86,10 @@ socketio = SocketIO(
     ],
     logger=True,
     engineio_logger=True,
-    async_mode='threading'  # Use threading mode for better compatibility
+    async_mode='threading',  # Use threading mode for better compatibility
+    # Fan emits out through a shared queue so every worker/instance delivers them
+    message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None,
+    channel=os.environ.get('SOCKETIO_CHANNEL', 'petproto-socketio')
 )
 
 # Store socketio in app extensions for access in blueprints
@@ -110,6 +131,9 @@ with app.app_context():
     shop_db.create_all()
     print("✅ Shop database initialized successfully")
 
+# ---- Per-request document identity map (X-Doc-Reads report in debug) ----
+init_data_access(app)
+
 # ---- Optional: Add a health check endpoint ----
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -152,6 +176,11 @@ app.register_blueprint(events_bp)
 app.register_blueprint(reactions_bp)
 app.register_blueprint(posts_bp)
 app.register_blueprint(pet_characteristics_bp)
+app.register_blueprint(presence_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(notifications_bp)
+app.register_blueprint(bootstrap_bp)
+app.register_blueprint(batch_bp)
 
 # Shop Blueprints
 app.register_blueprint(products_bp)
@@ -166,16 +195,18 @@ print("✅ All blueprints registered successfully")
 # ---- Initialize Socket.IO Event Handlers ----
 # This must come AFTER the blueprints are registered
 init_socketio_events(socketio)
+init_notifications(socketio)
 print("✅ Socket.IO event handlers initialized successfully")
 
-# ---- Socket.IO Connection Events ----
-@socketio.on('connect')
-def handle_connect():
-    print(f"✅ Client connected: {request.sid}")
+# ---- Friend suggestions graph: initial build + periodic rebuild ----
+socketio.start_background_task(graph_rebuilder, socketio)
 
-@socketio.on('disconnect')  
-def handle_disconnect():
-    print(f"❌ Client disconnected: {request.sid}")
+# ---- RSVP tallies: roll shard totals up onto the event docs ----
+socketio.start_background_task(rsvp_rollup_flusher, socketio)
+
+# ---- Socket.IO Connection Events ----
+# connect/disconnect are handled in social_chats.init_socketio_events; registering
+# them again here would replace those handlers (and their typing cleanup).
 
 if __name__ == '__main__':
     print("🚀 Starting Flask application with Socket.IO...")
@@ -0,0 +1,38 @@
+# backfill_chat_search_index.py
+# Rebuild every chat's searchIndex as month shards ({token}_{yyyymm}) from its
+# messages, replacing the old one-doc-per-token postings. Safe to re-run; run
+# while message traffic is paused, or re-run afterwards to pick up stragglers.
+from firebase_admin import firestore, initialize_app
+from chat_search import tokenize, index_ref, shard_id
+
+initialize_app()
+db = firestore.client()
+
+BATCH_WRITES = 50  # shard docs can be large; stay well under the request size limit
+
+for chat in db.collection('chats').select([]).stream():
+    shards = {}
+    for m in chat.reference.collection('messages').select(['text', 'sentAt']).stream():
+        d = m.to_dict()
+        if not d.get('sentAt'):
+            continue
+        for tok in tokenize(d.get('text')):
+            shard = shards.setdefault(shard_id(tok, d['sentAt']), {
+                'token': tok,
+                'period': f"{d['sentAt']:%Y%m}",
+                'postings': []
+            })
+            shard['postings'].append({'id': m.id, 'at': d['sentAt']})
+
+    col = index_ref(db, chat.id)
+    stale = [s.reference for s in col.select([]).stream() if s.id not in shards]
+    writes = [(ref, None) for ref in stale] + [(col.document(sid), data) for sid, data in shards.items()]
+    for start in range(0, len(writes), BATCH_WRITES):
+        batch = db.batch()
+        for ref, data in writes[start:start + BATCH_WRITES]:
+            if data is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, data)
+        batch.commit()
+    print(f"Indexed chat {chat.id}: {len(shards)} shards, {len(stale)} stale docs removed")
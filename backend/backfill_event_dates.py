@@ -0,0 +1,27 @@
+# backfill_event_dates.py
+# Give every event an eventDate timestamp parsed from its dateFilter string, or
+# an explicit null when it has none, so listings can filter in Firestore and
+# undated events stay in the upcoming list. Safe to re-run: it also clears
+# eventDates that an earlier run filled in from createdAt.
+from firebase_admin import firestore, initialize_app
+from social_events import parse_event_date
+
+initialize_app()
+db = firestore.client()
+
+batch = db.batch()
+pending = 0
+for doc in db.collection('events').stream():
+    data = doc.to_dict()
+    event_date = parse_event_date(data.get('dateFilter'))
+    if 'eventDate' in data and (data['eventDate'] is None) == (event_date is None):
+        continue
+    batch.update(doc.reference, {'eventDate': event_date})
+    pending += 1
+    print(f"Updated {doc.id}: {data.get('dateFilter')!r} -> {event_date}")
+    if pending == 500:
+        batch.commit()
+        batch = db.batch()
+        pending = 0
+if pending:
+    batch.commit()
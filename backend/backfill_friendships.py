@@ -0,0 +1,33 @@
+# backfill_friendships.py
+# Write friendship edges for requests accepted before friendships/ existed,
+# plus any pairs listed in the old users.friends arrays.
+# Safe to re-run: edges are written at fixed ids.
+from firebase_admin import firestore, initialize_app
+from datetime import datetime
+from friendships import add_friendship
+
+initialize_app()
+db = firestore.client()
+
+ACCEPTED_STATUSES = {'accept', 'accepted', 'approved'}
+BATCH_PAIRS = 250  # two writes per pair
+
+pairs = {}
+for r in db.collection('requests').stream():
+    d = r.to_dict()
+    if str(d.get('status', '')).lower() in ACCEPTED_STATUSES and d.get('from') and d.get('to'):
+        key = tuple(sorted((d['from'], d['to'])))
+        pairs.setdefault(key, (d.get('respondedAt') or d.get('createdAt'), r.id))
+
+for u in db.collection('users').select(['friends']).stream():
+    for f in (u.to_dict() or {}).get('friends', []) or []:
+        if f and f != u.id:
+            pairs.setdefault(tuple(sorted((u.id, f))), (None, None))
+
+items = list(pairs.items())
+for start in range(0, len(items), BATCH_PAIRS):
+    batch = db.batch()
+    for (a, b), (since, request_id) in items[start:start + BATCH_PAIRS]:
+        add_friendship(batch, db, a, b, since or datetime.utcnow(), request_id)
+    batch.commit()
+    print(f"Wrote {min(start + BATCH_PAIRS, len(items))}/{len(items)} friendships")
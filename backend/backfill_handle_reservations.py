@@ -0,0 +1,50 @@
+# backfill_handle_reservations.py
+# Reserve usernames/{normalized} and phones/{normalized} for existing users.
+# When two users already share a handle, the first one seen keeps it and the
+# clash is printed so it can be resolved by hand. Safe to re-run: handles
+# that are already reserved are skipped.
+from firebase_admin import firestore, initialize_app
+from handle_reservations import normalize_username, normalize_phone
+
+initialize_app()
+db = firestore.client()
+
+BATCH_LIMIT = 500
+
+claimed = {'usernames': {}, 'phones': {}}
+for coll in claimed:
+    for snap in db.collection(coll).stream():
+        claimed[coll][snap.id] = snap.to_dict().get('uid')
+
+batch = db.batch()
+pending = 0
+for user in db.collection('users').select(['preferredUsername', 'phone']).stream():
+    d = user.to_dict() or {}
+    for coll, field, normalize in (('usernames', 'preferredUsername', normalize_username),
+                                   ('phones', 'phone', normalize_phone)):
+        value = (d.get(field) or '').strip()
+        if not value:
+            continue
+        try:
+            key = normalize(value)
+        except ValueError:
+            print(f"Skipping {user.id}: unusable {field} {value!r}")
+            continue
+        owner = claimed[coll].get(key)
+        if owner and owner != user.id:
+            print(f"Clash on {coll}/{key}: kept {owner}, not {user.id}")
+            continue
+        if owner == user.id:
+            continue
+        claimed[coll][key] = user.id
+        batch.set(db.collection(coll).document(key), {
+            'uid': user.id, 'value': value, 'claimedAt': firestore.SERVER_TIMESTAMP
+        })
+        pending += 1
+        if pending >= BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+if pending:
+    batch.commit()
+print("Done")
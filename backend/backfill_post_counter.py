@@ -0,0 +1,14 @@
+# backfill_post_counter.py
+# Seed counters/posts with the real number of posts (one count() aggregation),
+# so the feed's totalEstimate includes posts created before the counter was
+# maintained. Safe to re-run; run while post traffic is paused, since creates
+# and deletes during the count would be lost when the counter is overwritten.
+from firebase_admin import firestore, initialize_app
+
+initialize_app()
+db = firestore.client()
+
+result = db.collection('posts').count().get()
+count = int(result[0][0].value) if result and result[0] else 0
+db.collection('counters').document('posts').set({'count': count})
+print(f"Set counters/posts to {count}")
@@ -0,0 +1,28 @@
+# backfill_reaction_summaries.py
+# Recompute reactions/{type}_{id} summary counts from the individual reaction
+# docs. Safe to re-run; run while reaction traffic is paused.
+from firebase_admin import firestore, initialize_app
+
+initialize_app()
+db = firestore.client()
+
+containers = {}
+for item in db.collection_group('items').stream():
+    parent = item.reference.parent.parent
+    if parent is None or parent.parent.id != 'reactions':
+        continue
+    rtype = item.to_dict().get('type')
+    if not rtype:
+        continue
+    counts = containers.setdefault(parent.id, {})
+    counts[rtype] = counts.get(rtype, 0) + 1
+
+for container_id, counts in containers.items():
+    entity_type, entity_id = container_id.split('_', 1)
+    db.collection('reactions').document(container_id).set({
+        'entityType': entity_type,
+        'entityId': entity_id,
+        'counts': counts,
+        'total': sum(counts.values())
+    })
+    print(f"Updated {container_id}: {counts}")
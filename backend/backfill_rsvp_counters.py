@@ -0,0 +1,24 @@
+# backfill_rsvp_counters.py
+# Rebuild the sharded RSVP tallies (events/{id}/rsvpShards) from existing
+# rsvps, and the rolled-up events/{id}.rsvpCounts read by listings. Existing
+# shards are overwritten: shard 0 gets the totals, the others are reset to
+# zero. Safe to re-run; run while RSVP traffic is paused.
+from firebase_admin import firestore, initialize_app
+from rsvp_counters import COUNTED_STATUSES, RSVP_SHARDS, shards_ref
+
+initialize_app()
+db = firestore.client()
+
+for event in db.collection('events').stream():
+    counts = {s: 0 for s in COUNTED_STATUSES}
+    for r in event.reference.collection('rsvps').stream():
+        status = r.to_dict().get('status')
+        if status in counts:
+            counts[status] += 1
+    batch = db.batch()
+    for i in range(RSVP_SHARDS):
+        batch.set(shards_ref(event.reference).document(str(i)),
+                  counts if i == 0 else {s: 0 for s in COUNTED_STATUSES})
+    batch.update(event.reference, {'rsvpCounts': counts})
+    batch.commit()
+    print(f"Updated {event.id}: {counts}")
@@ -0,0 +1,109 @@
+# batch_api.py
+# POST /batch: many GETs in one HTTP request.
+#
+# {"requests": [{"id": "r1", "path": "/reactions/summary?entityType=post&ids=a,b"},
+#               {"id": "r2", "path": "/events/e1/rsvps"}]}
+# -> {"responses": [{"id": "r1", "status": 200, "body": {...}}, ...]}
+#
+# Each sub-request is dispatched through the app's own routing (same
+# blueprints, same auth checks, same error handling) in a fresh request
+# context on a bounded, shared worker pool. The caller's token is verified
+# once up front and then forwarded; route handlers check it again locally
+# against the cached signing keys, so there is no extra network round trip.
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_cors import cross_origin
+from firebase_admin import auth
+from concurrent.futures import ThreadPoolExecutor, wait
+from werkzeug.test import EnvironBuilder
+import json
+import os
+import time
+
+batch_bp = Blueprint('batch_bp', __name__)
+
+MAX_BATCH_ITEMS = 20
+BATCH_TIMEOUT_SECONDS = float(os.environ.get('BATCH_TIMEOUT_SECONDS', 10))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 16))
+FORWARDED_HEADERS = ('Authorization', 'Accept', 'Accept-Language', 'If-None-Match')
+
+_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+
+
+def _dispatch(app, environ):
+    """Run one sub-request through the app and return (status, body)."""
+    with app.request_context(environ):
+        try:
+            resp = app.full_dispatch_request()
+        except Exception as e:
+            # wsgi_app normally turns unhandled errors into a 500; we bypass it
+            print(f"Error in batch sub-request {environ.get('PATH_INFO')}: {str(e)}")
+            return 500, {'error': 'Internal error'}
+        data = resp.get_data(as_text=True)
+        if resp.is_json:
+            try:
+                return resp.status_code, json.loads(data) if data else None
+            except ValueError:
+                pass
+        return resp.status_code, data
+
+
+def _item_error(item_id, status, message):
+    return {'id': item_id, 'status': status, 'body': {'error': message}}
+
+
+@batch_bp.route('/batch', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def batch():
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    token_header = request.headers.get('Authorization', '')
+    parts = token_header.split()
+    if len(parts) != 2 or parts[0] != 'Bearer':
+        return jsonify({'error': 'Missing token'}), 401
+    try:
+        auth.verify_id_token(parts[1])
+    except Exception:
+        return jsonify({'error': 'Invalid token'}), 401
+
+    items = (request.json or {}).get('requests')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'requests must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'error': f'At most {MAX_BATCH_ITEMS} requests per batch'}), 400
+
+    started = time.monotonic()
+    app = current_app._get_current_object()
+    headers = {h: request.headers[h] for h in FORWARDED_HEADERS if h in request.headers}
+    responses = [None] * len(items)
+    futures = {}
+    for i, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        item_id = item.get('id', str(i))
+        path = item.get('path')
+        method = (item.get('method') or 'GET').upper()
+        if method != 'GET':
+            responses[i] = _item_error(item_id, 405, 'Only GET requests can be batched')
+        elif not isinstance(path, str) or not path.startswith('/') or path.split('?')[0].rstrip('/') == '/batch':
+            responses[i] = _item_error(item_id, 400, 'Invalid path')
+        else:
+            environ = EnvironBuilder(path=path, method='GET', headers=headers,
+                                     base_url=request.host_url).get_environ()
+            environ['REMOTE_ADDR'] = request.remote_addr
+            futures[_executor.submit(_dispatch, app, environ)] = (i, item_id)
+
+    done, not_done = wait(futures, timeout=BATCH_TIMEOUT_SECONDS)
+    for future in done:
+        i, item_id = futures[future]
+        status, body = future.result()
+        responses[i] = {'id': item_id, 'status': status, 'body': body}
+    for future in not_done:
+        i, item_id = futures[future]
+        future.cancel()  # not started yet: never runs; running: result is dropped
+        responses[i] = _item_error(item_id, 504, 'Timed out')
+
+    return jsonify({
+        'responses': responses,
+        'elapsedMs': int((time.monotonic() - started) * 1000)
+    }), 200
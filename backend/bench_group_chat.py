@@ -0,0 +1,47 @@
+# bench_group_chat.py
+# Times the group-chat hot paths on a 1,000-member room.
+# Point it at the Firestore emulator, never at production:
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python bench_group_chat.py
+import os
+import time
+from firebase_admin import firestore, initialize_app
+from group_chats import add_members, page_members, hydrate_users, iter_member_uid_batches
+
+MEMBERS = int(os.environ.get('BENCH_MEMBERS', 1000))
+
+if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+    raise SystemExit("Set FIRESTORE_EMULATOR_HOST; this script writes test data.")
+
+initialize_app(options={'projectId': os.environ.get('GCLOUD_PROJECT', 'petproto-bench')})
+db = firestore.client()
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<40} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return result
+
+uids = [f'bench_user_{i:05d}' for i in range(MEMBERS)]
+batch = db.batch()
+for i, u in enumerate(uids):
+    batch.set(db.collection('users').document(u), {'displayName': u, 'petProfile': {'name': f'Pet {i}'}})
+    if i % 500 == 499:
+        batch.commit()
+        batch = db.batch()
+batch.commit()
+
+chat_ref = db.collection('chats').document()
+chat_ref.set({'isGroup': True, 'name': 'bench', 'memberCount': MEMBERS, 'messageCount': 0})
+
+timed(f"create {MEMBERS} member docs", lambda: add_members(db, chat_ref.id, uids))
+members, _ = timed("first members page (50)", lambda: page_members(db, chat_ref.id, 50))
+timed("hydrate first page (get_all)", lambda: hydrate_users(db, [m['uid'] for m in members]))
+timed("page through all members (200/batch)", lambda: sum(len(b) for b in iter_member_uid_batches(db, chat_ref.id)))
+
+def send_message():
+    batch = db.batch()
+    batch.set(chat_ref.collection('messages').document(), {'from': uids[0], 'text': 'hi', 'sentAt': time.time()})
+    batch.update(chat_ref, {'messageCount': firestore.Increment(1)})
+    batch.commit()
+
+timed("send one message (O(1) writes)", send_message)
@@ -0,0 +1,53 @@
+# bench_push_queue.py
+# Pushes to a few hundred users through PushQueue with the local stand-in
+# client and checks delivery, retries of flaky tokens and pruning of dead ones.
+# Point it at the Firestore emulator, never at production:
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python bench_push_queue.py
+import os
+import time
+from firebase_admin import firestore, initialize_app
+from push_queue import LocalMessagingClient, PushQueue
+import push_queue as pq
+
+USERS = int(os.environ.get('BENCH_USERS', 300))
+TOKENS_PER_USER = 2
+
+if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+    raise SystemExit("Set FIRESTORE_EMULATOR_HOST; this script writes test data.")
+
+initialize_app(options={'projectId': os.environ.get('GCLOUD_PROJECT', 'petproto-bench')})
+db = firestore.client()
+pq.BACKOFF_BASE_SECONDS = 0.05
+
+uids = [f'bench_push_{i:05d}' for i in range(USERS)]
+batch = db.batch()
+for n, uid in enumerate(uids):
+    for t in range(TOKENS_PER_USER):
+        batch.set(db.collection('users').document(uid).collection('fcmTokens').document(f't{t}'),
+                  {'token': f'{uid}-t{t}'})
+    if n % 200 == 199:
+        batch.commit()
+        batch = db.batch()
+batch.commit()
+
+dead = {f'{uid}-t1' for uid in uids[::10]}
+flaky = {f'{uid}-t0': 2 for uid in uids[1::10]}
+client = LocalMessagingClient(unregistered=dead, flaky=flaky)
+queue = PushQueue(client=client, db=db)
+
+start = time.perf_counter()
+for uid in uids:
+    queue.enqueue(uid, "Bench", "hello", {'n': 1})
+enqueued = time.perf_counter() - start
+assert queue.wait_idle(timeout=120), "queue did not drain"
+drained = time.perf_counter() - start
+
+expected = USERS * TOKENS_PER_USER - len(dead)
+print(f"enqueue {USERS} pushes: {enqueued * 1000:.1f} ms; drained in {drained:.2f}s")
+print(f"stats: {queue.stats}, multicast-delivered: {len(client.sent)}")
+assert len(client.sent) == expected, (len(client.sent), expected)
+assert queue.stats['pruned'] == len(dead)
+left = sum(1 for uid in uids[::10]
+           if db.collection('users').document(uid).collection('fcmTokens').document('t1').get().exists)
+assert left == 0, f"{left} dead tokens were not pruned"
+print("OK")
@@ -0,0 +1,54 @@
+# bench_rsvp_capacity.py
+# Fires hundreds of simultaneous "yes" RSVPs at a capped event and checks that
+# nobody is overbooked, everyone else is waitlisted, and that cancellations
+# promote waiters. Point it at the Firestore emulator, never at production:
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python bench_rsvp_capacity.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from firebase_admin import firestore, initialize_app
+from rsvp_counters import WAITLISTED, init_seats, set_rsvp, seats_ref, shard_counts
+
+CAPACITY = int(os.environ.get('BENCH_CAPACITY', 50))
+ATTENDEES = int(os.environ.get('BENCH_ATTENDEES', 300))
+WORKERS = int(os.environ.get('BENCH_WORKERS', 64))
+
+if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+    raise SystemExit("Set FIRESTORE_EMULATOR_HOST; this script writes test data.")
+
+initialize_app(options={'projectId': os.environ.get('GCLOUD_PROJECT', 'petproto-bench')})
+db = firestore.client()
+
+event_ref = db.collection('events').document()
+batch = db.batch()
+batch.set(event_ref, {'title': 'bench', 'capacity': CAPACITY, 'createdAt': datetime.utcnow()})
+init_seats(batch, event_ref, CAPACITY)
+batch.commit()
+
+def rsvp(i, status='yes'):
+    return set_rsvp(db, event_ref, f'bench_user_{i:05d}', status, datetime.utcnow(), CAPACITY)
+
+start = time.perf_counter()
+with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+    results = list(pool.map(rsvp, range(ATTENDEES)))
+elapsed = time.perf_counter() - start
+
+seated = sum(1 for _, new, _ in results if new == 'yes')
+waitlisted = sum(1 for _, new, _ in results if new == WAITLISTED)
+taken = sum(s.to_dict().get('taken', 0) for s in seats_ref(event_ref).stream())
+print(f"{ATTENDEES} RSVPs in {elapsed:.2f}s ({ATTENDEES / elapsed:.1f}/s): "
+      f"{seated} seated, {waitlisted} waitlisted, {taken} seats taken")
+assert seated == min(CAPACITY, ATTENDEES), "overbooked or under-filled"
+assert taken == seated, "seat pool out of step with RSVPs"
+assert seated + waitlisted == ATTENDEES
+
+# cancel ten seated attendees; each seat should go to a waiter
+seated_ids = [i for i, (_, new, _) in enumerate(results) if new == 'yes'][:10]
+with ThreadPoolExecutor(max_workers=10) as pool:
+    cancels = list(pool.map(lambda i: rsvp(i, 'no'), seated_ids))
+promoted = [p for _, _, p in cancels if p]
+counts = shard_counts(db, [event_ref.id])[event_ref.id]
+print(f"cancelled {len(cancels)}, promoted {len(promoted)}, tallies {counts}")
+assert counts['yes'] == min(CAPACITY, ATTENDEES)
+assert len(set(promoted)) == len(promoted) == min(10, max(ATTENDEES - CAPACITY, 0))
@@ -0,0 +1,53 @@
+# bench_social_graph.py
+# Builds a synthetic graph (1M friendships by default) in memory and times
+# friend suggestions. No Firestore needed:
+#   python bench_social_graph.py
+#   BENCH_USERS=50000 BENCH_EDGES=200000 python bench_social_graph.py
+import os
+import random
+import statistics
+import time
+from social_graph import SocialGraph, PET_FIELDS
+
+USERS = int(os.environ.get('BENCH_USERS', 100000))
+EDGES = int(os.environ.get('BENCH_EDGES', 1000000))
+LOOKUPS = int(os.environ.get('BENCH_LOOKUPS', 1000))
+
+random.seed(42)
+uids = [f'u{i:07d}' for i in range(USERS)]
+species = ['dog', 'cat', 'rabbit', 'bird']
+breeds = [f'breed{i}' for i in range(30)]
+towns = [f'town{i}' for i in range(50)]
+
+start = time.perf_counter()
+adj, blocked, pending, pets = {}, {}, {}, {}
+made = 0
+while made < EDGES:
+    a, b = random.sample(uids, 2)
+    if b in adj.get(a, ()):
+        continue
+    SocialGraph._link(adj, a, b)
+    made += 1
+for _ in range(USERS // 20):
+    SocialGraph._link(pending, *random.sample(uids, 2))
+for _ in range(USERS // 100):
+    SocialGraph._link(blocked, *random.sample(uids, 2))
+for u in uids:
+    pets[u] = dict(zip(PET_FIELDS, (random.choice(species), random.choice(breeds),
+                                    random.choice(['male', 'female']), 'brown', random.choice(towns))))
+graph = SocialGraph()
+graph.replace(adj, blocked, pending, pets)
+print(f"built {graph.stats()['edges']} edges / {USERS} users in {time.perf_counter() - start:.1f}s")
+
+timings = []
+for uid in random.sample(uids, LOOKUPS):
+    t = time.perf_counter()
+    result = graph.suggestions(uid)
+    timings.append((time.perf_counter() - t) * 1000)
+    friends = adj.get(uid, set())
+    assert all(c not in friends and c != uid for c, _, _ in result)
+    assert all(c not in pending.get(uid, ()) and c not in blocked.get(uid, ()) for c, _, _ in result)
+
+timings.sort()
+print(f"{LOOKUPS} lookups: p50 {statistics.median(timings):.2f} ms, "
+      f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms, max {timings[-1]:.2f} ms")
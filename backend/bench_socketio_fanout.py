@@ -0,0 +1,115 @@
+# bench_socketio_fanout.py
+# Starts two Socket.IO workers that share SOCKETIO_MESSAGE_QUEUE the same way
+# app.py does, connects a client to worker B, emits to the client's user room
+# from worker A and checks that every message arrives. Run it against the
+# docker-compose Redis:
+#   docker compose up -d redis
+#   SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python bench_socketio_fanout.py
+# The workers do not touch Firebase; they only carry the rooms and the queue.
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+MESSAGES = int(os.environ.get('BENCH_MESSAGES', 50))
+PORT_A = int(os.environ.get('BENCH_PORT_A', 5101))
+PORT_B = int(os.environ.get('BENCH_PORT_B', 5102))
+UID = 'bench_fanout_user'
+
+
+def run_worker(port):
+    """One app worker: join/emit hooks on a SocketIO configured like app.py."""
+    from flask import Flask, request, jsonify
+    from flask_socketio import SocketIO, join_room
+    from presence import user_room
+
+    app = Flask(__name__)
+    socketio = SocketIO(
+        app,
+        cors_allowed_origins='*',
+        message_queue=os.environ['SOCKETIO_MESSAGE_QUEUE'],
+        channel=os.environ.get('SOCKETIO_CHANNEL', 'petproto-socketio')
+    )
+
+    @socketio.on('join_user_room')
+    def join(data):
+        join_room(user_room(data['uid']))
+        return {'worker': port}
+
+    @app.route('/emit', methods=['POST'])
+    def emit():
+        body = request.json or {}
+        socketio.emit('fanout_probe', {'n': body['n'], 'from': port, 'sentAt': time.time()},
+                      room=user_room(body['uid']))
+        return jsonify({'ok': True})
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    socketio.run(app, host='127.0.0.1', port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise SystemExit(f"worker on port {port} did not start")
+
+
+def main():
+    import requests
+    import socketio as sio_client
+
+    if not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        raise SystemExit("Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0).")
+
+    workers = [subprocess.Popen([sys.executable, __file__, 'worker', str(p)]) for p in (PORT_A, PORT_B)]
+    try:
+        for p in (PORT_A, PORT_B):
+            wait_for_port(p)
+
+        received, latencies, done = [], [], threading.Event()
+        client = sio_client.Client()
+
+        @client.on('fanout_probe')
+        def on_probe(data):
+            received.append(data['n'])
+            latencies.append(time.time() - data['sentAt'])
+            if len(received) == MESSAGES:
+                done.set()
+
+        client.connect(f'http://127.0.0.1:{PORT_B}', transports=['polling'])
+        joined = client.call('join_user_room', {'uid': UID}, timeout=10)
+        assert joined == {'worker': PORT_B}, joined
+
+        start = time.perf_counter()
+        for n in range(MESSAGES):
+            requests.post(f'http://127.0.0.1:{PORT_A}/emit', json={'uid': UID, 'n': n}, timeout=5)
+        done.wait(timeout=30)
+        elapsed = time.perf_counter() - start
+        client.disconnect()
+
+        print(f"emitted {MESSAGES} on worker A (:{PORT_A}), client on worker B (:{PORT_B}) "
+              f"received {len(received)} in {elapsed:.2f}s")
+        if latencies:
+            latencies.sort()
+            print(f"queue latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                  f"max {latencies[-1] * 1000:.1f} ms")
+        assert sorted(received) == list(range(MESSAGES)), "messages were lost between workers"
+        print("OK")
+    finally:
+        for w in workers:
+            w.terminate()
+        for w in workers:
+            w.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == 'worker':
+        run_worker(int(sys.argv[2]))
+    else:
+        main()
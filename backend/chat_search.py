@@ -0,0 +1,100 @@
+# chat_search.py
+# Per-chat inverted index over message text.
+#
+# chats/{chatId}/searchIndex/{token}_{yyyymm} = {
+#     'token': token,
+#     'period': 'yyyymm',
+#     'postings': [{'id': messageId, 'at': sentAt}, ...],
+# }
+# Postings are sharded by the month the message was sent, so no single index
+# doc grows without bound (a shard holds ~15k postings before it nears the
+# 1 MiB document limit) and writes for a common token spread over time. They
+# are written in their own batch after the message is committed: an index
+# failure is logged and never fails a send. Searching runs one query per query
+# token over its shards and reads only the messages on the requested page.
+
+from firebase_admin import firestore
+import re
+
+MAX_TOKENS_PER_MESSAGE = 100
+MAX_QUERY_TOKENS = 8
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE = 50
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'if', 'in',
+    'is', 'it', 'of', 'on', 'or', 'so', 'the', 'to', 'was', 'we', 'with', 'you',
+}
+
+
+def tokenize(text):
+    """Distinct lower-cased word tokens, minus stop words, in first-seen order."""
+    seen = []
+    for tok in _TOKEN_RE.findall((text or '').lower()):
+        tok = tok.strip('_')  # ids like __x__ are reserved by Firestore
+        if len(tok) < 2 or tok in STOP_WORDS or tok in seen:
+            continue
+        # Firestore document ids cannot contain '/', and \w never matches it
+        seen.append(tok[:100])
+        if len(seen) >= MAX_TOKENS_PER_MESSAGE:
+            break
+    return seen
+
+
+def index_ref(db, chat_id):
+    return db.collection('chats').document(chat_id).collection('searchIndex')
+
+
+def shard_id(token, sent_at):
+    return f"{token}_{sent_at:%Y%m}"
+
+
+def index_message(db, chat_id, message_id, text, sent_at):
+    """Add a committed message's postings to its month shards (best effort)."""
+    tokens = tokenize(text)
+    if not tokens:
+        return
+    col = index_ref(db, chat_id)
+    batch = db.batch()
+    for tok in tokens:
+        batch.set(col.document(shard_id(tok, sent_at)), {
+            'token': tok,
+            'period': f"{sent_at:%Y%m}",
+            'postings': firestore.ArrayUnion([{'id': message_id, 'at': sent_at}])
+        }, merge=True)
+    try:
+        batch.commit()
+    except Exception as e:
+        print(f"Error indexing message {message_id} in chat {chat_id}: {str(e)}")
+
+
+def rank(postings_by_token):
+    """
+    Merge posting lists into [(message_id, score, at)], best first.
+    Score is the number of distinct query tokens a message matched; ties go to
+    the newest message.
+    """
+    hits = {}
+    for postings in postings_by_token.values():
+        for p in postings:
+            score, at = hits.get(p['id'], (0, p.get('at')))
+            hits[p['id']] = (score + 1, at)
+    ranked = [(mid, score, at) for mid, (score, at) in hits.items()]
+    ranked.sort(key=lambda r: (r[1], r[2].timestamp() if hasattr(r[2], 'timestamp') else 0), reverse=True)
+    return ranked
+
+
+def search(db, chat_id, query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """One page of (message_id, score, at) ranked hits and the total hit count."""
+    tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return [], 0
+    postings = {}
+    for tok in tokens:
+        # a message sits in exactly one shard per token, so shards just concatenate
+        for snap in index_ref(db, chat_id).where('token', '==', tok).stream():
+            postings.setdefault(tok, []).extend(snap.to_dict().get('postings', []))
+    ranked = rank(postings)
+    return ranked[offset:offset + limit], len(ranked)
@@ -0,0 +1,124 @@
+# chat_typing.py
+# Server-side typing indicator state for chat rooms.
+#
+# Clients fire typing_start/typing_stop on every keystroke burst. Instead of
+# rebroadcasting each one, we keep a small state machine per (chat, user) and
+# only emit on a real transition. Users that go quiet are flipped back to
+# "stopped" by a sweeper, and each socket is rate limited with a token bucket.
+
+import threading
+import time
+
+TYPING_TIMEOUT_SECONDS = 5.0      # silence before a user is considered stopped
+SWEEP_INTERVAL_SECONDS = 1.0      # how often the sweeper looks for stale typers
+SID_RATE_PER_SECOND = 4.0         # sustained typing events allowed per socket
+SID_BURST = 8                     # short bursts allowed per socket
+
+
+class TypingTracker:
+    """Tracks who is typing in which chat and counts broadcast volume."""
+
+    def __init__(self, timeout=TYPING_TIMEOUT_SECONDS, rate=SID_RATE_PER_SECOND,
+                 burst=SID_BURST, clock=time.monotonic):
+        self.timeout = timeout
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._typing = {}       # (chat_id, uid) -> last activity
+        self._sid_keys = {}     # sid -> {(chat_id, uid), ...}
+        self._buckets = {}      # sid -> (tokens, last refill)
+        self._stats = {
+            'received': 0,          # typing events received from clients
+            'rateLimited': 0,       # dropped by the per-sid token bucket
+            'coalesced': 0,         # accepted but no state change, not broadcast
+            'broadcastStart': 0,
+            'broadcastStop': 0,
+            'timedOut': 0,          # stops generated by the sweeper
+        }
+
+    def allow(self, sid):
+        """Token bucket per socket; returns False when the event must be dropped."""
+        now = self._clock()
+        with self._lock:
+            self._stats['received'] += 1
+            tokens, last = self._buckets.get(sid, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                self._buckets[sid] = (tokens, now)
+                self._stats['rateLimited'] += 1
+                return False
+            self._buckets[sid] = (tokens - 1.0, now)
+            return True
+
+    def start(self, sid, chat_id, uid):
+        """Mark uid as typing. Returns True if this is a stopped -> typing transition."""
+        key = (chat_id, uid)
+        with self._lock:
+            was_typing = key in self._typing
+            self._typing[key] = self._clock()
+            self._sid_keys.setdefault(sid, set()).add(key)
+            if was_typing:
+                self._stats['coalesced'] += 1
+                return False
+            self._stats['broadcastStart'] += 1
+            return True
+
+    def stop(self, sid, chat_id, uid):
+        """Mark uid as stopped. Returns True if this is a typing -> stopped transition."""
+        key = (chat_id, uid)
+        with self._lock:
+            keys = self._sid_keys.get(sid)
+            if keys:
+                keys.discard(key)
+            if self._typing.pop(key, None) is None:
+                self._stats['coalesced'] += 1
+                return False
+            self._stats['broadcastStop'] += 1
+            return True
+
+    def expire(self):
+        """Drop typers that went quiet; returns the (chat_id, uid) pairs to announce."""
+        cutoff = self._clock() - self.timeout
+        with self._lock:
+            stale = [k for k, ts in self._typing.items() if ts < cutoff]
+            for key in stale:
+                del self._typing[key]
+            self._stats['timedOut'] += len(stale)
+            self._stats['broadcastStop'] += len(stale)
+        return stale
+
+    def forget_sid(self, sid):
+        """Socket went away: stop everything it was typing in and free its bucket."""
+        with self._lock:
+            self._buckets.pop(sid, None)
+            keys = self._sid_keys.pop(sid, set())
+            stopped = [k for k in keys if self._typing.pop(k, None) is not None]
+            self._stats['broadcastStop'] += len(stopped)
+        return stopped
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['activeTypers'] = len(self._typing)
+            stats['trackedSockets'] = len(self._buckets)
+        stats['broadcasts'] = stats['broadcastStart'] + stats['broadcastStop']
+        return stats
+
+
+typing_tracker = TypingTracker()
+
+
+def typing_sweeper(socketio, tracker=typing_tracker):
+    """Background task: emit 'stopped' for users that timed out."""
+    while True:
+        socketio.sleep(SWEEP_INTERVAL_SECONDS)
+        try:
+            for chat_id, uid in tracker.expire():
+                socketio.emit('user_typing', {
+                    'chatId': chat_id,
+                    'userId': uid,
+                    'isTyping': False
+                }, room=f'chat_{chat_id}')
+        except Exception as e:
+            print(f"Error in typing sweeper: {str(e)}")
@@ -0,0 +1,188 @@
+# cleanup_jobs.py
+# Background cascade deletes with progress tracking.
+#
+# Deleting a post, an event or a comment thread can touch thousands of docs
+# (comments, replies, RSVPs, reactions). The endpoints delete the visible
+# document right away and hand the rest to a small worker pool here. Each job
+# records its progress in cleanupJobs/{jobId} so any instance can report it.
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from firebase_admin import auth, firestore
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint("jobs_bp", __name__)
+
+BATCH_LIMIT = 500   # Firestore max writes per batch
+IN_LIMIT = 30       # max values in an 'in' query
+PAGE_SIZE = 500
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cleanup")
+
+
+class _BatchDeleter:
+    """Accumulates deletes and commits them BATCH_LIMIT at a time."""
+
+    def __init__(self, db, on_commit=None):
+        self.db = db
+        self.on_commit = on_commit
+        self.batch = db.batch()
+        self.pending = 0
+        self.deleted = 0
+
+    def delete(self, ref):
+        self.batch.delete(ref)
+        self.pending += 1
+        if self.pending >= BATCH_LIMIT:
+            self.commit()
+
+    def commit(self):
+        if not self.pending:
+            return
+        self.batch.commit()
+        self.deleted += self.pending
+        self.batch = self.db.batch()
+        self.pending = 0
+        if self.on_commit:
+            self.on_commit(self.deleted)
+
+
+def _delete_query(deleter, query):
+    """Delete every doc a query returns, paging so memory stays bounded."""
+    while True:
+        snaps = list(query.limit(PAGE_SIZE).stream())
+        for s in snaps:
+            deleter.delete(s.reference)
+        # commit before re-querying, otherwise the same page comes back
+        deleter.commit()
+        if len(snaps) < PAGE_SIZE:
+            return
+
+
+def _delete_reactions(deleter, db, entity_type, entity_id):
+    """reactions/{type}_{id}/items/* plus the container doc."""
+    container = db.collection("reactions").document(f"{entity_type}_{entity_id}")
+    _delete_query(deleter, container.collection("items"))
+    deleter.delete(container)
+
+
+def _delete_comment_reactions(deleter, db, comment_ids):
+    """
+    Reactions for a set of comments. Only containers that exist (they carry
+    the reaction summary) are walked, found with one get_all per chunk instead
+    of a query per comment.
+    """
+    refs = [db.collection("reactions").document(f"comment_{cid}") for cid in comment_ids]
+    for start in range(0, len(refs), PAGE_SIZE):
+        for snap in db.get_all(refs[start:start + PAGE_SIZE]):
+            if snap.exists:
+                _delete_query(deleter, snap.reference.collection("items"))
+                deleter.delete(snap.reference)
+
+
+def delete_comment_tree(db, comments_col, root_id, deleter=None, include_root=True):
+    """
+    Breadth-first delete of a comment and all of its descendants.
+    Each level is found with 'in' queries over up to IN_LIMIT parents, so a
+    thread costs O(depth * width / 30) queries and no recursion.
+    """
+    deleter = deleter or _BatchDeleter(db)
+    frontier = [root_id]
+    if include_root:
+        deleter.delete(comments_col.document(root_id))
+    _delete_comment_reactions(deleter, db, [root_id])
+    while frontier:
+        next_frontier = []
+        for start in range(0, len(frontier), IN_LIMIT):
+            parents = frontier[start:start + IN_LIMIT]
+            for child in comments_col.where("parentCommentId", "in", parents).stream():
+                next_frontier.append(child.id)
+                deleter.delete(child.reference)
+        _delete_comment_reactions(deleter, db, next_frontier)
+        frontier = next_frontier
+    deleter.commit()
+    return deleter.deleted
+
+
+def delete_parent_cascade(db, parent_type, parent_id, deleter=None):
+    """Everything hanging off a post/event: comments (+their reactions), RSVPs (+tallies, seats, waitlist), reactions."""
+    deleter = deleter or _BatchDeleter(db)
+    parent_ref = db.collection(parent_type).document(parent_id)
+    comments = parent_ref.collection("comments")
+    while True:
+        snaps = list(comments.limit(PAGE_SIZE).stream())
+        for c in snaps:
+            deleter.delete(c.reference)
+        _delete_comment_reactions(deleter, db, [c.id for c in snaps])
+        deleter.commit()
+        if len(snaps) < PAGE_SIZE:
+            break
+    _delete_query(deleter, parent_ref.collection("rsvps"))
+    _delete_query(deleter, parent_ref.collection("rsvpShards"))
+    _delete_query(deleter, parent_ref.collection("seatShards"))
+    _delete_query(deleter, parent_ref.collection("waitlist"))
+    entity_type = "post" if parent_type == "posts" else "event"
+    _delete_reactions(deleter, db, entity_type, parent_id)
+    deleter.commit()
+    return deleter.deleted
+
+
+def _run_job(job_ref, fn, *args):
+    db = firestore.client()
+
+    def progress(deleted):
+        job_ref.update({"deleted": deleted, "updatedAt": datetime.utcnow()})
+
+    job_ref.update({"status": "running", "updatedAt": datetime.utcnow()})
+    try:
+        deleted = fn(db, *args, deleter=_BatchDeleter(db, on_commit=progress))
+        job_ref.update({"status": "done", "deleted": deleted, "updatedAt": datetime.utcnow()})
+        logger.debug("Cleanup job %s finished, %s docs deleted", job_ref.id, deleted)
+    except Exception as e:
+        logger.warning("Cleanup job %s failed: %s", job_ref.id, e)
+        job_ref.update({"status": "failed", "error": str(e), "updatedAt": datetime.utcnow()})
+
+
+def start_job(db, owner, kind, target, fn, *args):
+    """Record a job and run fn(db, *args, deleter=...) in the background. Returns the job id."""
+    job_ref = db.collection("cleanupJobs").document()
+    now = datetime.utcnow()
+    job_ref.set({
+        "owner": owner,
+        "kind": kind,
+        "target": target,
+        "status": "queued",
+        "deleted": 0,
+        "createdAt": now,
+        "updatedAt": now,
+    })
+    _executor.submit(_run_job, job_ref, fn, *args)
+    return job_ref.id
+
+
+@jobs_bp.route("/cleanup-jobs/<job_id>", methods=["GET", "OPTIONS"])
+@cross_origin()
+def get_job(job_id):
+    if request.method == "OPTIONS":
+        return jsonify({}), 200
+
+    hdr = request.headers.get("Authorization", "").split()
+    if len(hdr) != 2 or hdr[0] != "Bearer":
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        uid = auth.verify_id_token(hdr[1])["uid"]
+    except Exception:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    snap = firestore.client().collection("cleanupJobs").document(job_id).get()
+    if not snap.exists:
+        return jsonify({"error": "Not found"}), 404
+    job = snap.to_dict()
+    if job.get("owner") != uid:
+        return jsonify({"error": "Forbidden"}), 403
+    job["id"] = snap.id
+    return jsonify(job), 200
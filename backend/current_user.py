@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from firebase_admin import auth, firestore
 from flask_cors import cross_origin
+from sparse_fields import parse_fields
+from data_access import get_doc
 
 current_user_bp = Blueprint('current_user_bp', __name__)
 
@@ -23,8 +25,14 @@ def get_current_user():
     except Exception as e:
         return jsonify({'error': 'Invalid token: ' + str(e)}), 401
 
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     db = firestore.client()
-    doc = db.collection('users').document(uid).get()
+    # ?fields= is pushed down to Firestore so only those fields are read
+    doc = get_doc(db.collection('users').document(uid), fields)
     if doc.exists:
         data = doc.to_dict()
         # Attach petProfile at top level if you want
@@ -0,0 +1,177 @@
+# data_access.py
+# Request-scoped identity map for Firestore document reads.
+#
+# Within one Flask request, get_doc(ref) returns the snapshot already fetched
+# for the same path instead of reading it again, and writes made through
+# set_doc keep the map in step (remember records a write made any other way).
+# A projected read (field_paths) is reused only for the same or a narrower
+# projection; a full snapshot serves any projection. Outside a request (background tasks,
+# scripts) everything passes straight through to Firestore. Transactional
+# reads must keep using ref.get(transaction=...), never this map.
+#
+# In debug mode (app.debug or DATA_ACCESS_DEBUG=1) every response carries
+# X-Doc-Reads: fetched=<n>; reused=<n> and repeated paths are logged.
+
+from flask import g, has_request_context, current_app
+from collections import Counter
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+_MAP_ATTR = '_doc_identity_map'
+
+
+class _LocalSnapshot:
+    """Snapshot-shaped view of data this request wrote itself."""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = self._data
+        for part in field_path.split('.'):
+            value = value[part]
+        return value
+
+
+class _IdentityMap:
+    def __init__(self):
+        self.entries = {}   # path -> (snapshot, field_paths or None for full)
+        self.fetched = Counter()
+        self.reused = Counter()
+
+
+def _current():
+    if not has_request_context():
+        return None
+    m = getattr(g, _MAP_ATTR, None)
+    if m is None:
+        m = _IdentityMap()
+        setattr(g, _MAP_ATTR, m)
+    return m
+
+
+def _covers(cached_paths, wanted_paths):
+    if cached_paths is None:
+        return True
+    if wanted_paths is None:
+        return False
+    return all(any(w == c or w.startswith(c + '.') for c in cached_paths) for w in wanted_paths)
+
+
+def get_doc(ref, field_paths=None):
+    """ref.get(field_paths=...) at most once per request and path."""
+    m = _current()
+    if m is None:
+        return ref.get(field_paths=field_paths)
+    entry = m.entries.get(ref.path)
+    if entry is not None and _covers(entry[1], field_paths):
+        m.reused[ref.path] += 1
+        return entry[0]
+    snap = ref.get(field_paths=field_paths)
+    m.fetched[ref.path] += 1
+    if entry is None or entry[1] is not None:
+        # never replace a full snapshot with a projected one
+        m.entries[ref.path] = (snap, list(field_paths) if field_paths is not None else None)
+    return snap
+
+
+def get_docs(db, refs, field_paths=None):
+    """Snapshots for refs (in order); only paths not already in the map are fetched, in one get_all."""
+    m = _current()
+    if m is None:
+        by_path = {s.reference.path: s for s in db.get_all(refs, field_paths=field_paths)} if refs else {}
+        return [by_path[r.path] for r in refs if r.path in by_path]
+    missing = [r for r in {r.path: r for r in refs}.values()
+               if not (r.path in m.entries and _covers(m.entries[r.path][1], field_paths))]
+    if missing:
+        for snap in db.get_all(missing, field_paths=field_paths):
+            path = snap.reference.path
+            m.fetched[path] += 1
+            if path not in m.entries or m.entries[path][1] is not None:
+                m.entries[path] = (snap, list(field_paths) if field_paths is not None else None)
+    out = []
+    fetched = {r.path for r in missing}
+    for r in refs:
+        if r.path not in fetched:
+            m.reused[r.path] += 1
+        out.append(m.entries[r.path][0])
+    return out
+
+
+def _is_plain(value):
+    """False for sentinels/transforms (SERVER_TIMESTAMP, Increment, ...) we cannot apply locally."""
+    if isinstance(value, dict):
+        return all(_is_plain(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return all(_is_plain(v) for v in value)
+    return not type(value).__module__.startswith('google.cloud.firestore')
+
+
+def _deep_merge(base, data):
+    merged = dict(base)
+    for k, v in data.items():
+        merged[k] = _deep_merge(base[k], v) if isinstance(v, dict) and isinstance(base.get(k), dict) else v
+    return merged
+
+
+def remember(ref, data):
+    """Record data known to be the current full contents of ref (None = deleted)."""
+    m = _current()
+    if m is not None:
+        m.entries[ref.path] = (_LocalSnapshot(ref, data), None)
+
+
+def _forget(ref):
+    m = _current()
+    if m is not None:
+        m.entries.pop(ref.path, None)
+
+
+def set_doc(ref, data, merge=False):
+    """ref.set() that keeps the identity map current."""
+    result = ref.set(data, merge=merge)
+    m = _current()
+    if m is None:
+        return result
+    entry = m.entries.get(ref.path)
+    if not _is_plain(data):
+        _forget(ref)
+    elif not merge:
+        remember(ref, dict(data))
+    elif entry is not None and entry[1] is None:
+        # merge onto a full snapshot we already hold, map by map like Firestore does
+        remember(ref, _deep_merge(entry[0].to_dict() or {}, data))
+    else:
+        _forget(ref)
+    return result
+
+
+def _debug_enabled(app):
+    return app.debug or os.environ.get('DATA_ACCESS_DEBUG') == '1'
+
+
+def init_data_access(app):
+    """Register the debug report: X-Doc-Reads header and a log line for repeated reads."""
+
+    @app.after_request
+    def _report_doc_reads(response):
+        m = getattr(g, _MAP_ATTR, None)
+        if m is None or not _debug_enabled(current_app):
+            return response
+        fetched, reused = sum(m.fetched.values()), sum(m.reused.values())
+        response.headers['X-Doc-Reads'] = f'fetched={fetched}; reused={reused}'
+        if reused:
+            top = ', '.join(f'{p} x{n}' for p, n in m.reused.most_common(5))
+            logger.info("Identity map saved %d duplicate reads (%s)", reused, top)
+        return response
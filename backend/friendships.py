@@ -0,0 +1,50 @@
+# friendships.py
+# Friendship edges.
+#
+# friendships/{uid}_{friendUid} = {'uid', 'friend', 'since', 'requestId'}
+# Every friendship is stored as two directed edges written in the same
+# transaction that accepts the request, so "friends of X" is a single query on
+# uid (ordered by friend, composite index on (uid, friend)) and costs
+# O(friends) reads no matter how many requests X ever sent or received.
+
+FRIENDS_PAGE_SIZE = 50
+MAX_FRIENDS_PAGE = 200
+ALL_FRIENDS_LIMIT = 5000   # cap for callers that need every friend uid
+
+
+def edge_ref(db, uid, friend_uid):
+    return db.collection('friendships').document(f'{uid}_{friend_uid}')
+
+
+def add_friendship(writer, db, a, b, since, request_id=None):
+    """Queue both edges on a transaction or batch."""
+    for uid, friend_uid in ((a, b), (b, a)):
+        writer.set(edge_ref(db, uid, friend_uid), {
+            'uid': uid,
+            'friend': friend_uid,
+            'since': since,
+            'requestId': request_id
+        })
+
+
+def remove_friendship(writer, db, a, b):
+    """Queue deletes for both edges (a no-op for pairs that are not friends)."""
+    writer.delete(edge_ref(db, a, b))
+    writer.delete(edge_ref(db, b, a))
+
+
+def page_friend_uids(db, uid, limit=FRIENDS_PAGE_SIZE, cursor=None):
+    """One page of friend uids ordered by uid; returns (uids, next_cursor)."""
+    query = db.collection('friendships').where('uid', '==', uid).order_by('friend')
+    if cursor:
+        query = query.start_after({'friend': cursor})
+    snaps = list(query.select(['friend']).limit(limit).stream())
+    uids = [s.to_dict()['friend'] for s in snaps]
+    return uids, (uids[-1] if len(uids) == limit else None)
+
+
+def friend_uids(db, uid, limit=ALL_FRIENDS_LIMIT):
+    """Every friend uid (up to limit) for fan-out style callers."""
+    snaps = db.collection('friendships').where('uid', '==', uid) \
+        .select(['friend']).limit(limit).stream()
+    return [s.to_dict()['friend'] for s in snaps]
@@ -76,7 +76,8 @@ def google_signin():
                 # You can prefill some fields if you want
                 'firstName': decoded_token.get('name', '').split(' ')[0] if decoded_token.get('name') else '',
                 'lastName': ' '.join(decoded_token.get('name', '').split(' ')[1:]) if decoded_token.get('name') and len(decoded_token.get('name', '').split(' ')) > 1 else '',
-                'preferredUsername': email.split('@')[0] if email else '',
+                # chosen (and reserved) at registration; prefilling would skip the reservation
+                'preferredUsername': '',
                 'phone': '',
                 'sex': '',
                 'address': ''
@@ -0,0 +1,179 @@
+# group_chats.py
+# Membership helpers for group chats.
+#
+# Group membership lives in chats/{chatId}/members/{uid} ({uid, role, joinedAt,
+# lastReadCount}) instead of a participants array, so a group is not limited by
+# the chat document size and a message send touches O(1) documents. Unread
+# counts for groups are derived: chat.messageCount - member.lastReadCount.
+# 1-1 chats (and groups created before this) keep their participants array and
+# are still handled through it.
+
+from firebase_admin import firestore
+from datetime import datetime
+from presence import presence_registry, user_room
+from data_access import get_docs
+
+MAX_GROUP_MEMBERS = 5000   # hard cap per group
+BATCH_LIMIT = 500          # Firestore max writes per batch
+MEMBER_PAGE_SIZE = 50      # default page for /chats/<id>/members
+MAX_MEMBER_PAGE = 200
+FANOUT_BATCH = 200         # members handled per fan-out round
+MAX_MEMBERS_PER_ADD = BATCH_LIMIT - 1  # member docs + the memberCount update in one transaction
+
+ROLES = ('owner', 'admin', 'member')
+
+
+def members_ref(db, chat_id):
+    return db.collection('chats').document(chat_id).collection('members')
+
+
+def add_members(db, chat_id, uids, role='member', joined_at=None, last_read_count=0):
+    """
+    Write member docs in bounded batches. Returns the number written.
+    last_read_count should be the chat's messageCount when joining an active
+    group, so earlier history does not show up as unread.
+    """
+    joined_at = joined_at or datetime.utcnow()
+    col = members_ref(db, chat_id)
+    written = 0
+    for start in range(0, len(uids), BATCH_LIMIT):
+        batch = db.batch()
+        for member_uid in uids[start:start + BATCH_LIMIT]:
+            batch.set(col.document(member_uid), {
+                'uid': member_uid,
+                'role': role,
+                'joinedAt': joined_at,
+                'lastReadCount': last_read_count
+            }, merge=True)
+        batch.commit()
+        written += len(uids[start:start + BATCH_LIMIT])
+    return written
+
+
+@firestore.transactional
+def add_members_capped(transaction, db, chat_id, uids, role='member', joined_at=None):
+    """
+    Add the uids that are not members yet to an active group, checking
+    MAX_GROUP_MEMBERS against memberCount in the same transaction so concurrent
+    adds cannot overshoot it. Returns the uids added; raises ValueError when
+    the group would go over the cap.
+    """
+    chat_ref = db.collection('chats').document(chat_id)
+    col = members_ref(db, chat_id)
+    chat = chat_ref.get(transaction=transaction).to_dict() or {}
+    existing = {s.id for s in transaction.get_all([col.document(u) for u in uids]) if s.exists}
+    to_add = [u for u in uids if u not in existing]
+    if chat.get('memberCount', 0) + len(to_add) > MAX_GROUP_MEMBERS:
+        raise ValueError(f'Groups are limited to {MAX_GROUP_MEMBERS} members')
+
+    joined_at = joined_at or datetime.utcnow()
+    for member_uid in to_add:
+        # earlier history does not count as unread for a new member
+        transaction.set(col.document(member_uid), {
+            'uid': member_uid,
+            'role': role,
+            'joinedAt': joined_at,
+            'lastReadCount': chat.get('messageCount', 0)
+        })
+    if to_add:
+        transaction.update(chat_ref, {'memberCount': firestore.Increment(len(to_add))})
+    return to_add
+
+
+def get_member(db, chat_id, uid, transaction=None):
+    """Member doc dict, or None if uid is not in the group."""
+    snap = members_ref(db, chat_id).document(uid).get(transaction=transaction)
+    return snap.to_dict() if snap.exists else None
+
+
+def is_member(db, chat_id, chat_data, uid):
+    """Membership check for both participants-array chats and member subcollections."""
+    if 'participants' in chat_data:
+        return uid in chat_data.get('participants', [])
+    return get_member(db, chat_id, uid) is not None
+
+
+def member_chat_ids(db, uid):
+    """(chat_id, member dict) for every subcollection-based group uid belongs to."""
+    snaps = db.collection_group('members').where('uid', '==', uid).stream()
+    return [(s.reference.parent.parent.id, s.to_dict()) for s in snaps]
+
+
+def group_unread_total(db, uid):
+    """
+    Unread messages across uid's subcollection-based groups. Group unread is
+    derived per member rather than added to users.unreadTotal, so badges sum
+    this with the stored direct-chat total.
+    """
+    memberships = dict(member_chat_ids(db, uid))
+    if not memberships:
+        return 0
+    refs = [db.collection('chats').document(cid) for cid in memberships]
+    total = 0
+    for snap in db.get_all(refs, field_paths=['messageCount']):
+        if snap.exists:
+            last_read = memberships[snap.id].get('lastReadCount', 0)
+            total += max((snap.to_dict() or {}).get('messageCount', 0) - last_read, 0)
+    return total
+
+
+def page_members(db, chat_id, limit=MEMBER_PAGE_SIZE, cursor=None):
+    """One page of members ordered by uid; returns (members, next_cursor)."""
+    query = members_ref(db, chat_id).order_by('uid')
+    if cursor:
+        query = query.start_after({'uid': cursor})
+    snaps = list(query.limit(limit).stream())
+    members = [s.to_dict() for s in snaps]
+    next_cursor = members[-1]['uid'] if len(members) == limit else None
+    return members, next_cursor
+
+
+def iter_member_uid_batches(db, chat_id, batch_size=FANOUT_BATCH):
+    """Yield member uids in bounded batches, paging with a cursor."""
+    cursor = None
+    while True:
+        members, cursor = page_members(db, chat_id, batch_size, cursor)
+        if members:
+            yield [m['uid'] for m in members]
+        if not cursor:
+            return
+
+
+def hydrate_users(db, uids, field_paths=('displayName', 'petProfile.name', 'petProfile.image')):
+    """Bulk-read user docs (projected) for a page of uids: uid -> dict."""
+    refs = [db.collection('users').document(u) for u in uids]
+    if not refs:
+        return {}
+    return {
+        snap.id: snap.to_dict() or {}
+        for snap in get_docs(db, refs, list(field_paths))
+        if snap.exists
+    }
+
+
+def fan_out_group_message(socketio, chat_id, sender_uid, preview):
+    """
+    Background task: tell every member about a new group message.
+    Online members get a chat_activity event in their personal room, offline
+    members get a push. Members are paged FANOUT_BATCH at a time so a 1,000+
+    member room never holds everything in memory or blocks the request.
+    """
+    # late import: social_requests imports social_chats, which imports us
+    from social_requests import send_push
+
+    db = firestore.client()
+    for uids in iter_member_uid_batches(db, chat_id):
+        status = presence_registry.snapshot(uids)
+        for member_uid in uids:
+            if member_uid == sender_uid:
+                continue
+            if status[member_uid]['isOnline']:
+                socketio.emit('chat_activity', {
+                    'chatId': chat_id,
+                    'from': sender_uid,
+                    'preview': preview
+                }, room=user_room(member_uid))
+            else:
+                send_push(member_uid, title="New message", body=preview,
+                          data={'chatId': chat_id})
+        socketio.sleep(0)
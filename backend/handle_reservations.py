@@ -0,0 +1,118 @@
+# handle_reservations.py
+# Unique usernames and phone numbers.
+#
+# usernames/{normalized} = {'uid', 'value', 'claimedAt'}
+# phones/{normalized}    = {'uid', 'value', 'claimedAt'}
+# A profile write claims its reservations in the same transaction, and releases
+# the user's previous ones when they change. Two concurrent signups for the same
+# handle conflict on the reservation doc, so exactly one of them wins, and a
+# uniqueness check is a single document lookup instead of a users query.
+
+from firebase_admin import firestore
+import re
+import unicodedata
+
+MAX_HANDLE_LENGTH = 100
+MIN_PHONE_DIGITS = 7
+# profile fields that may only be written through claim_profile
+HANDLE_FIELDS = ('preferredUsername', 'phone')
+
+
+class HandleTaken(Exception):
+    """The username or phone is reserved by another user; .field says which."""
+
+    def __init__(self, field):
+        super().__init__(f'{field} already taken')
+        self.field = field
+
+
+def normalize_username(value):
+    """Case- and width-insensitive key; raises ValueError if unusable as a doc id."""
+    key = unicodedata.normalize('NFKC', (value or '').strip()).casefold()
+    if not key or len(key) > MAX_HANDLE_LENGTH or '/' in key or key in ('.', '..') \
+            or (key.startswith('__') and key.endswith('__')):
+        raise ValueError('Invalid username')
+    return key
+
+
+def normalize_phone(value):
+    """Digits with an optional leading '+', so '+1 (555) 010-2030' == '+15550102030'."""
+    value = (value or '').strip()
+    digits = re.sub(r'\D', '', value)
+    if len(digits) < MIN_PHONE_DIGITS:
+        raise ValueError('Invalid phone number')
+    return ('+' if value.startswith('+') else '') + digits
+
+
+def username_ref(db, value):
+    return db.collection('usernames').document(normalize_username(value))
+
+
+def phone_ref(db, value):
+    return db.collection('phones').document(normalize_phone(value))
+
+
+def _owner(snap):
+    return snap.to_dict().get('uid') if snap.exists else None
+
+
+@firestore.transactional
+def claim_profile(transaction, db, uid, user_data, merge=True, now=None):
+    """
+    Write user_data to users/{uid} together with reservations for whichever of
+    preferredUsername and phone it contains (a blank phone is not reserved; a
+    key that is absent keeps its current reservation). Raises HandleTaken if
+    either belongs to someone else, ValueError if malformed. Returns the user
+    document as written.
+    """
+    now = now or firestore.SERVER_TIMESTAMP
+    user_ref = db.collection('users').document(uid)
+    claims = []
+    if 'preferredUsername' in user_data:
+        claims.append(('username', username_ref(db, user_data['preferredUsername']), user_data['preferredUsername']))
+    if (user_data.get('phone') or '').strip():
+        claims.append(('phone', phone_ref(db, user_data['phone']), user_data['phone']))
+
+    # reads first: current profile, then the new and old reservations
+    current = user_ref.get(transaction=transaction)
+    current = current.to_dict() if current.exists else {}
+    for field, ref, _ in claims:
+        owner = _owner(ref.get(transaction=transaction))
+        if owner and owner != uid:
+            raise HandleTaken(field)
+
+    releases = []
+    new_ids = {ref.path for _, ref, _ in claims}
+    for make_ref, key in ((username_ref, 'preferredUsername'), (phone_ref, 'phone')):
+        if key not in user_data and merge:
+            continue
+        try:
+            old_ref = make_ref(db, current.get(key)) if current.get(key) else None
+        except ValueError:
+            old_ref = None  # legacy value that was never reservable
+        if old_ref is not None and old_ref.path not in new_ids \
+                and _owner(old_ref.get(transaction=transaction)) == uid:
+            releases.append(old_ref)
+
+    for _, ref, value in claims:
+        transaction.set(ref, {'uid': uid, 'value': value.strip(), 'claimedAt': now})
+    for ref in releases:
+        transaction.delete(ref)
+    transaction.set(user_ref, user_data, merge=merge)
+    return {**current, **user_data} if merge else dict(user_data)
+
+
+def availability(db, uid=None, username=None, phone=None):
+    """{'username': {...}, 'phone': {...}} for whichever values were given."""
+    out = {}
+    for field, value, make_ref in (('username', username, username_ref), ('phone', phone, phone_ref)):
+        if value is None:
+            continue
+        try:
+            ref = make_ref(db, value)
+        except ValueError as e:
+            out[field] = {'available': False, 'reason': str(e)}
+            continue
+        owner = _owner(ref.get())
+        out[field] = {'available': owner is None or owner == uid, 'normalized': ref.id}
+    return out
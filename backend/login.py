@@ -3,9 +3,15 @@ from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from firebase_admin import auth, firestore
 import logging
+from sparse_fields import parse_fields, merge_paths, project
 
 login_bp = Blueprint('login_bp', __name__)
 
+LOGIN_FIELDS = [
+    'userType', 'firstName', 'lastName', 'preferredUsername', 'phone',
+    'sex', 'address', 'petProfile', 'user'
+]
+
 @login_bp.route('/login', methods=['POST', 'OPTIONS'])
 @cross_origin()
 def login():
@@ -15,6 +21,11 @@ def login():
     data = request.json
     if not data or 'idToken' not in data:
         return jsonify({'error': 'Missing idToken'}), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
         id_token = data['idToken']
@@ -23,7 +34,10 @@ def login():
         email = decoded_token.get('email', '')
 
         db = firestore.client()
-        doc = db.collection('users').document(uid).get()
+        # Only the fields the response is built from (narrowed further by ?fields=)
+        read_paths = LOGIN_FIELDS if fields is None else \
+            merge_paths([f for f in fields if f.split('.')[0] in LOGIN_FIELDS], ['user'])
+        doc = db.collection('users').document(uid).get(field_paths=read_paths)
         user_data = doc.to_dict() if doc.exists else {}
         # Flatten any accidental wrap
         if user_data and "user" in user_data:
@@ -42,7 +56,7 @@ def login():
             address=user_data.get('address', ''),
             petProfile=user_data.get('petProfile', None)
         )
-        return jsonify(response_data), 200
+        return jsonify(project(response_data, fields, keep=('uid',))), 200
     except Exception as e:
         logging.error(f"Login error: {e}")
         return jsonify({'error': f'Authentication failed: {str(e)}'}), 401
@@ -2,6 +2,7 @@
 from flask import Blueprint, request, jsonify
 from firebase_admin import auth, firestore
 from flask_cors import cross_origin
+from sparse_fields import parse_fields, merge_paths, project
 
 matches_bp = Blueprint('matches_bp', __name__)
 
@@ -52,10 +53,15 @@ def get_pet_matches():
     except Exception as e:
         return jsonify({'error': 'Invalid token: ' + str(e)}), 401
 
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     db = firestore.client()
 
-    # Get the current user's record
-    current_doc = db.collection('users').document(current_uid).get()
+    # Get the current user's record (only the pet profile is used)
+    current_doc = db.collection('users').document(current_uid).get(field_paths=['petProfile'])
     if not current_doc.exists:
         return jsonify({'error': 'Current user not found'}), 404
     current_user = current_doc.to_dict()
@@ -65,8 +71,12 @@ def get_pet_matches():
     current_pet = current_user['petProfile']
 
     matches = []
-    # Iterate through all user documents and consider only those with a pet profile
-    for doc in db.collection('users').stream():
+    # Iterate through all user documents and consider only those with a pet profile.
+    # With ?fields= only those fields (plus the petProfile used for scoring) are read.
+    users = db.collection('users')
+    if fields is not None:
+        users = users.select(merge_paths(fields, ['petProfile']))
+    for doc in users.stream():
         if doc.id == current_uid:
             continue
         other_user = doc.to_dict()
@@ -77,7 +87,7 @@ def get_pet_matches():
         # Optionally add the match score to the response
         other_user['petMatchScore'] = match_score
         other_user['uid'] = doc.id
-        matches.append(other_user)
+        matches.append(project(other_user, fields, keep=('uid', 'petMatchScore')))
 
     # Sort the matches by the pet match score in descending order
     matches = sorted(matches, key=lambda x: x.get('petMatchScore', 0), reverse=True)
@@ -0,0 +1,56 @@
+# migrate_direct_chats.py
+# Move 1-1 chats onto their canonical dm_<uidA>_<uidB> ids and merge duplicates.
+# Messages from every duplicate are copied into the canonical chat, then the
+# old chat documents (and their messages) are deleted.
+from firebase_admin import firestore, initialize_app
+from social_chats import direct_chat_id
+
+# Run only ONCE!
+initialize_app()
+db = firestore.client()
+
+BATCH_LIMIT = 500
+
+def _copy_and_delete_messages(src_ref, dst_ref):
+    moved = 0
+    batch = db.batch()
+    pending = 0
+    for msg in src_ref.collection('messages').stream():
+        batch.set(dst_ref.collection('messages').document(msg.id), msg.to_dict())
+        batch.delete(msg.reference)
+        pending += 2
+        moved += 1
+        if pending >= BATCH_LIMIT - 1:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return moved
+
+pairs = {}
+for chat in db.collection('chats').where('isGroup', '==', False).stream():
+    participants = sorted(set(chat.to_dict().get('participants', [])))
+    if len(participants) != 2:
+        continue
+    pairs.setdefault(tuple(participants), []).append(chat)
+
+for (uid_a, uid_b), chats in pairs.items():
+    canonical_id = direct_chat_id(uid_a, uid_b)
+    canonical_ref = db.collection('chats').document(canonical_id)
+    duplicates = [c for c in chats if c.id != canonical_id]
+    if not duplicates:
+        continue
+
+    last_updated = [c.to_dict().get('lastUpdated') for c in chats]
+    last_updated = max([t for t in last_updated if t is not None], default=None)
+    canonical_ref.set({
+        'participants': [uid_a, uid_b],
+        'isGroup': False,
+        'lastUpdated': last_updated or firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+    for dup in duplicates:
+        moved = _copy_and_delete_messages(dup.reference, canonical_ref)
+        dup.reference.delete()
+        print(f"Merged {dup.id} -> {canonical_id} ({moved} messages)")
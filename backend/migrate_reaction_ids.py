@@ -0,0 +1,69 @@
+# migrate_reaction_ids.py
+# Re-key reactions from random ids to reactions/{type}_{id}/items/{uid}.
+# When a user somehow has several reactions on one entity the newest wins.
+# Run backfill_reaction_summaries.py afterwards so counts match the result.
+from firebase_admin import firestore, initialize_app
+
+# Run only ONCE!
+initialize_app()
+db = firestore.client()
+
+BATCH_LIMIT = 500
+
+def _when(d):
+    at = d.get('updatedAt') or d.get('createdAt')
+    return at.timestamp() if hasattr(at, 'timestamp') else 0
+
+# (container id, uid) -> (snapshot, data) of the reaction to keep
+keep = {}
+stale = []
+ref_uid = {}  # path -> owning uid
+for item in db.collection_group('items').stream():
+    parent = item.reference.parent.parent
+    if parent is None or parent.parent.id != 'reactions':
+        continue
+    d = item.to_dict()
+    uid = d.get('user')
+    if not uid:
+        continue
+    ref_uid[item.reference.path] = uid
+    key = (parent.id, uid)
+    current = keep.get(key)
+    if current is None or _when(d) > _when(current[1]):
+        if current is not None:
+            stale.append(current[0].reference)
+        keep[key] = (item, d)
+    else:
+        stale.append(item.reference)
+
+batch = db.batch()
+pending = 0
+moved = 0
+
+def _queue(fn, *args):
+    global batch, pending
+    fn(*args)
+    pending += 1
+    if pending >= BATCH_LIMIT:
+        batch.commit()
+        batch = db.batch()
+        pending = 0
+
+for (container_id, uid), (item, d) in keep.items():
+    if item.id == uid:
+        continue
+    target = db.collection('reactions').document(container_id).collection('items').document(uid)
+    _queue(batch.set, target, d)
+    _queue(batch.delete, item.reference)
+    moved += 1
+    print(f"Moved {container_id}/{item.id} -> {uid}")
+
+for ref in stale:
+    if ref.id == ref_uid[ref.path]:
+        continue  # an older uid-keyed doc is overwritten above, not deleted
+    _queue(batch.delete, ref)
+    print(f"Dropped duplicate {ref.path}")
+
+if pending:
+    batch.commit()
+print(f"Done: {moved} re-keyed, {len(stale)} duplicates dropped")
@@ -0,0 +1,276 @@
+# notifications.py
+# Per-user notification inbox.
+#
+# users/{uid}/notifications/{id} = {
+#     'kind', 'targetType', 'targetId', 'actors': [uid, ...], 'count',
+#     'read', 'data', 'createdAt', 'updatedAt',
+# }
+# users/{uid}.notificationsUnread counts unread inbox entries.
+#
+# Bursts coalesce: reactions, comments, replies and RSVPs on the same target
+# share one doc (id = kind_targetType_targetId) while it is unread and was
+# touched within COALESCE_WINDOW, so 5 reactions read "5 people reacted to your
+# post" instead of five entries. Every change is emitted to the recipient's
+# socket room (user_<uid>) when they are connected here; otherwise the first
+# event of a burst falls back to an FCM push. Writes happen on a small worker
+# pool so the request that caused them does not wait.
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from firebase_admin import auth, firestore
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from presence import presence_registry, user_room
+from push_queue import push_queue
+from group_chats import hydrate_users
+
+notifications_bp = Blueprint('notifications_bp', __name__)
+
+COALESCE_WINDOW = timedelta(hours=6)
+COALESCED_KINDS = ('reaction', 'comment', 'reply', 'rsvp')
+MAX_ACTORS = 20            # distinct actors remembered per coalesced entry
+NOTIFICATIONS_PAGE_SIZE = 20
+MAX_NOTIFICATIONS_PAGE = 100
+MAX_MARK_IDS = 100
+BATCH_LIMIT = 500
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='notify')
+_socketio = None
+
+
+def init_notifications(socketio):
+    """Give the module the SocketIO instance used for realtime delivery."""
+    global _socketio
+    _socketio = socketio
+
+
+def inbox_ref(db, uid):
+    return db.collection('users').document(uid).collection('notifications')
+
+
+def notification_text(kind, count, target_type=None, data=None):
+    target = target_type or 'post'
+    many = count > 1
+    if kind == 'reaction':
+        return f'{count} people reacted to your {target}' if many else f'Someone reacted to your {target}'
+    if kind == 'comment':
+        return f'{count} new comments on your {target}' if many else f'New comment on your {target}'
+    if kind == 'reply':
+        return f'{count} new replies to your comment' if many else 'New reply to your comment'
+    if kind == 'rsvp':
+        return f"{count} people RSVP'd to your event" if many else "Someone RSVP'd to your event"
+    if kind == 'request_received':
+        return f"You have a new {(data or {}).get('type', 'friend')} request"
+    if kind == 'request_accepted':
+        return 'Your request was accepted! Say hello.'
+    return 'You have a new notification'
+
+
+def _out(snap_id, d):
+    d = dict(d)
+    d['id'] = snap_id
+    d['text'] = notification_text(d.get('kind'), d.get('count', 1), d.get('targetType'), d.get('data'))
+    for k in ('createdAt', 'updatedAt'):
+        if hasattr(d.get(k), 'isoformat'):
+            d[k] = d[k].isoformat()
+    return d
+
+
+@firestore.transactional
+def _record(transaction, db, to_uid, kind, actor, target_type, target_id, data, now):
+    """Write or coalesce one event. Returns (doc id, doc dict, is_new_entry)."""
+    inbox = inbox_ref(db, to_uid)
+    coalesce = kind in COALESCED_KINDS and target_id
+    ref = inbox.document(f'{kind}_{target_type}_{target_id}') if coalesce else inbox.document()
+    snap = ref.get(transaction=transaction) if coalesce else None
+    existing = snap.to_dict() if snap is not None and snap.exists else None
+
+    updated = existing.get('updatedAt') if existing else None
+    if updated is not None and hasattr(updated, 'replace'):
+        updated = updated.replace(tzinfo=None)
+    if existing and not existing.get('read') and updated and now - updated <= COALESCE_WINDOW:
+        actors = existing.get('actors', [])
+        if actor and actor not in actors:
+            actors = (actors + [actor])[-MAX_ACTORS:]
+        doc = {**existing, 'actors': actors, 'count': existing.get('count', 1) + 1,
+               'data': {**existing.get('data', {}), **(data or {})}, 'updatedAt': now}
+        transaction.set(ref, doc)
+        return ref.id, doc, False
+
+    doc = {
+        'kind': kind,
+        'targetType': target_type,
+        'targetId': target_id,
+        'actors': [actor] if actor else [],
+        'count': 1,
+        'read': False,
+        'data': data or {},
+        'createdAt': now,
+        'updatedAt': now,
+    }
+    transaction.set(ref, doc)
+    if not (existing and not existing.get('read')):
+        # a stale-but-unread entry being restarted is already counted
+        transaction.set(db.collection('users').document(to_uid),
+                        {'notificationsUnread': firestore.Increment(1)}, merge=True)
+    return ref.id, doc, True
+
+
+def _deliver(to_uid, doc_id, doc, is_new):
+    payload = _out(doc_id, doc)
+    if _socketio is not None and presence_registry.status(to_uid)['isOnline']:
+        _socketio.emit('notification', {'notification': payload, 'isNew': is_new},
+                       room=user_room(to_uid))
+    elif is_new:
+        # only the first event of a burst buzzes the phone
+        push_data = {k: str(v) for k, v in (doc.get('data') or {}).items()}
+        push_data['notificationId'] = doc_id
+        push_queue.enqueue(to_uid, 'PetProto', payload['text'], push_data)
+
+
+def _notify(to_uid, kind, actor, target_type, target_id, data):
+    try:
+        db = firestore.client()
+        doc_id, doc, is_new = _record(db.transaction(), db, to_uid, kind, actor,
+                                      target_type, target_id, data, datetime.utcnow())
+        _deliver(to_uid, doc_id, doc, is_new)
+    except Exception as e:
+        print(f"Error recording notification for {to_uid}: {str(e)}")
+
+
+def _notify_author(doc_path, kind, actor, target_type, target_id, data):
+    try:
+        snap = firestore.client().document(doc_path).get(field_paths=['author'])
+        author = snap.to_dict().get('author') if snap.exists else None
+    except Exception as e:
+        print(f"Error looking up author of {doc_path}: {str(e)}")
+        return
+    if author and author != actor:
+        _notify(author, kind, actor, target_type, target_id, data)
+
+
+def notify(to_uid, kind, actor=None, target_type=None, target_id=None, data=None):
+    """Queue a notification for to_uid; never notifies users about their own actions."""
+    if not to_uid or to_uid == actor:
+        return
+    _executor.submit(_notify, to_uid, kind, actor, target_type, target_id, data)
+
+
+def notify_author(doc_path, kind, actor=None, target_type=None, target_id=None, data=None):
+    """Like notify(), for the `author` of doc_path (looked up off the request thread)."""
+    _executor.submit(_notify_author, doc_path, kind, actor, target_type, target_id, data)
+
+
+def _get_uid(req):
+    hdr = req.headers.get('Authorization', '').split()
+    if len(hdr) != 2 or hdr[0] != 'Bearer':
+        return None
+    try:
+        return auth.verify_id_token(hdr[1])['uid']
+    except:
+        return None
+
+
+@notifications_bp.route('/notifications', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def list_notifications():
+    """Newest-first inbox page: ?limit=&cursor=<last id>, plus unreadCount"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    uid = _get_uid(request)
+    if not uid:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        limit = min(int(request.args.get('limit', NOTIFICATIONS_PAGE_SIZE)), MAX_NOTIFICATIONS_PAGE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
+    db = firestore.client()
+    inbox = inbox_ref(db, uid)
+    query = inbox.order_by('updatedAt', direction=firestore.Query.DESCENDING)
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor_snap = inbox.document(cursor).get()
+        if not cursor_snap.exists:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.start_after(cursor_snap)
+    snaps = list(query.limit(limit).stream())
+
+    # names for the latest few actors on the page, one projected get_all
+    actor_ids = {a for s in snaps for a in s.to_dict().get('actors', [])[-3:]}
+    users = hydrate_users(db, list(actor_ids))
+    out = []
+    for s in snaps:
+        d = _out(s.id, s.to_dict())
+        d['actorNames'] = [
+            users.get(a, {}).get('petProfile', {}).get('name') or users.get(a, {}).get('displayName') or a
+            for a in d.get('actors', [])[-3:]
+        ]
+        out.append(d)
+
+    user_snap = db.collection('users').document(uid).get(field_paths=['notificationsUnread'])
+    unread = (user_snap.to_dict() or {}).get('notificationsUnread', 0) if user_snap.exists else 0
+    return jsonify({
+        'notifications': out,
+        'unreadCount': max(unread, 0),
+        'nextCursor': snaps[-1].id if len(snaps) == limit else None
+    }), 200
+
+
+@firestore.transactional
+def _mark_read(transaction, db, uid, ids, now):
+    refs = [inbox_ref(db, uid).document(i) for i in ids]
+    newly_read = 0
+    for snap in transaction.get_all(refs):
+        if snap.exists and not snap.to_dict().get('read'):
+            newly_read += 1
+            transaction.update(snap.reference, {'read': True, 'readAt': now})
+    if newly_read:
+        transaction.set(db.collection('users').document(uid),
+                        {'notificationsUnread': firestore.Increment(-newly_read)}, merge=True)
+    return newly_read
+
+
+def _mark_all_read(db, uid, now):
+    """Flip every unread entry in bounded batches, then zero the counter."""
+    unread = inbox_ref(db, uid).where('read', '==', False)
+    marked = 0
+    while True:
+        snaps = list(unread.limit(BATCH_LIMIT).stream())
+        if not snaps:
+            db.collection('users').document(uid).set({'notificationsUnread': 0}, merge=True)
+            return marked
+        batch = db.batch()
+        for s in snaps:
+            batch.update(s.reference, {'read': True, 'readAt': now})
+        batch.commit()
+        marked += len(snaps)
+
+
+@notifications_bp.route('/notifications/read', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def mark_notifications_read():
+    """Body: {"ids": [...]} or {"all": true}"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    uid = _get_uid(request)
+    if not uid:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.json or {}
+    db = firestore.client()
+    now = datetime.utcnow()
+    if data.get('all'):
+        return jsonify({'marked': _mark_all_read(db, uid, now), 'unreadCount': 0}), 200
+
+    ids = list(dict.fromkeys(i for i in data.get('ids', []) if isinstance(i, str) and i))
+    if not ids:
+        return jsonify({'error': 'ids or all required'}), 400
+    if len(ids) > MAX_MARK_IDS:
+        return jsonify({'error': f'At most {MAX_MARK_IDS} ids per request'}), 400
+    return jsonify({'marked': _mark_read(db.transaction(), db, uid, ids, now)}), 200
@@ -53,7 +53,7 @@ def get_pet_characteristics():
         return jsonify({'error': 'Invalid token: ' + str(e)}), 401
 
     db = firestore.client()
-    user_doc = db.collection('users').document(uid).get()
+    user_doc = db.collection('users').document(uid).get(field_paths=['petProfile.characteristics'])
     if not user_doc.exists:
         return jsonify({'error': 'User not found'}), 404
     pet_profile = user_doc.to_dict().get('petProfile', {})
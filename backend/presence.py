@@ -0,0 +1,193 @@
+# presence.py
+# In-memory presence for connected users.
+#
+# Every socket that identifies itself is counted against its uid, so a user with
+# several tabs/devices stays online until the last one disconnects. Transitions
+# are pushed to friends' personal rooms (user_<uid>) right away, while the
+# isOnline/lastSeen fields on users/{uid} are written behind in batches by a
+# background flusher instead of once per connect/disconnect.
+#
+# Note: the registry is per process. With a message queue (see app.py) the
+# pushes reach every node, but /presence only knows this process's sockets.
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from firebase_admin import auth, firestore
+from datetime import datetime
+import threading
+from friendships import friend_uids
+
+presence_bp = Blueprint('presence_bp', __name__)
+
+FLUSH_INTERVAL_SECONDS = 10.0   # how often pending isOnline/lastSeen writes are flushed
+BATCH_LIMIT = 500               # Firestore max writes per batch
+MAX_QUERY_UIDS = 200            # cap for the bulk /presence lookup
+
+
+def user_room(uid):
+    return f'user_{uid}'
+
+
+class PresenceRegistry:
+    """uid -> live sids, plus a write-behind buffer of presence changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sids = {}        # uid -> {sid, ...}
+        self._uid_by_sid = {}  # sid -> uid
+        self._last_seen = {}   # uid -> datetime of last disconnect (or connect)
+        self._friends = {}     # uid -> [friend uid, ...] cached while online
+        self._pending = {}     # uid -> {'isOnline': bool, 'lastSeen': datetime}
+
+    def connect(self, sid, uid, friends=None):
+        """Register sid for uid. Returns True if the user just came online."""
+        now = datetime.utcnow()
+        with self._lock:
+            if self._uid_by_sid.get(sid) == uid:
+                return False
+            self._uid_by_sid[sid] = uid
+            sids = self._sids.setdefault(uid, set())
+            came_online = not sids
+            sids.add(sid)
+            if friends is not None:
+                self._friends[uid] = list(friends)
+            self._last_seen[uid] = now
+            if came_online:
+                self._pending[uid] = {'isOnline': True, 'lastSeen': now}
+            return came_online
+
+    def disconnect(self, sid):
+        """Forget sid. Returns (uid, went_offline); uid is None for anonymous sockets."""
+        now = datetime.utcnow()
+        with self._lock:
+            uid = self._uid_by_sid.pop(sid, None)
+            if uid is None:
+                return None, False
+            sids = self._sids.get(uid, set())
+            sids.discard(sid)
+            self._last_seen[uid] = now
+            if sids:
+                return uid, False
+            self._sids.pop(uid, None)
+            self._pending[uid] = {'isOnline': False, 'lastSeen': now}
+            return uid, True
+
+    def is_known(self, sid):
+        with self._lock:
+            return sid in self._uid_by_sid
+
+    def friends_of(self, uid):
+        with self._lock:
+            return list(self._friends.get(uid, []))
+
+    def forget_friends(self, uid):
+        with self._lock:
+            if uid not in self._sids:
+                self._friends.pop(uid, None)
+
+    def status(self, uid):
+        with self._lock:
+            return {
+                'isOnline': bool(self._sids.get(uid)),
+                'lastSeen': self._last_seen.get(uid)
+            }
+
+    def known(self, uid):
+        """True if this process has seen uid connect since it started."""
+        with self._lock:
+            return uid in self._last_seen
+
+    def snapshot(self, uids):
+        with self._lock:
+            return {
+                u: {'isOnline': bool(self._sids.get(u)), 'lastSeen': self._last_seen.get(u)}
+                for u in uids
+            }
+
+    def drain(self):
+        """Take all buffered presence writes."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def requeue(self, pending):
+        """Put back writes that failed, without clobbering newer ones."""
+        with self._lock:
+            for uid, fields in pending.items():
+                self._pending.setdefault(uid, fields)
+
+
+presence_registry = PresenceRegistry()
+
+
+def flush_presence(db, registry=presence_registry):
+    """Write buffered isOnline/lastSeen changes with batched writes."""
+    pending = registry.drain()
+    items = list(pending.items())
+    written = 0
+    for start in range(0, len(items), BATCH_LIMIT):
+        chunk = items[start:start + BATCH_LIMIT]
+        batch = db.batch()
+        for uid, fields in chunk:
+            batch.set(db.collection('users').document(uid), fields, merge=True)
+        try:
+            batch.commit()
+            written += len(chunk)
+        except Exception as e:
+            print(f"Error flushing presence: {str(e)}")
+            registry.requeue(dict(items[start:]))
+            break
+    return written
+
+
+def presence_flusher(socketio, registry=presence_registry):
+    """Background task: periodically flush the write-behind buffer."""
+    while True:
+        socketio.sleep(FLUSH_INTERVAL_SECONDS)
+        try:
+            flush_presence(firestore.client(), registry)
+        except Exception as e:
+            print(f"Error in presence flusher: {str(e)}")
+
+
+def load_friend_uids(db, uid):
+    """Friend uids used to fan presence changes out (read once per session)."""
+    return friend_uids(db, uid)
+
+
+def broadcast_presence(socketio, uid, registry=presence_registry):
+    """Push uid's current presence to each online friend's personal room."""
+    payload = registry.status(uid)
+    payload['uid'] = uid
+    if payload['lastSeen']:
+        payload['lastSeen'] = payload['lastSeen'].isoformat()
+    for friend_uid in registry.friends_of(uid):
+        socketio.emit('presence', payload, room=user_room(friend_uid))
+
+
+@presence_bp.route('/presence', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def presence():
+    """Bulk presence lookup: /presence?uids=a,b,c (answered from memory)"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    hdr = request.headers.get('Authorization', '').split()
+    if len(hdr) != 2 or hdr[0] != 'Bearer':
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        auth.verify_id_token(hdr[1])
+    except:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    uids = [u for u in request.args.get('uids', '').split(',') if u]
+    if len(uids) > MAX_QUERY_UIDS:
+        return jsonify({'error': f'At most {MAX_QUERY_UIDS} uids per request'}), 400
+
+    out = {}
+    for uid, st in presence_registry.snapshot(uids).items():
+        out[uid] = {
+            'isOnline': st['isOnline'],
+            'lastSeen': st['lastSeen'].isoformat() if st['lastSeen'] else None
+        }
+    return jsonify({'presence': out}), 200
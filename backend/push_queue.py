@@ -0,0 +1,239 @@
+# push_queue.py
+# Background FCM delivery.
+#
+# send_push() only enqueues; a small worker pool does the slow part off the
+# request thread. Each worker drains whatever is queued (up to DRAIN_LIMIT
+# jobs), groups jobs with the same notification, loads every recipient's
+# users/{uid}/fcmTokens and sends one multicast per MULTICAST_LIMIT tokens.
+# Tokens FCM reports as unregistered are deleted; transient failures are
+# retried with exponential backoff, only for the tokens that failed.
+#
+# The messaging client is pluggable: firebase_admin.messaging in production,
+# LocalMessagingClient (PUSH_CLIENT=local) for development and checks.
+
+from firebase_admin import firestore, messaging
+from collections import namedtuple
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', '4'))
+MULTICAST_LIMIT = 500      # FCM max tokens per multicast
+DRAIN_LIMIT = 100          # jobs a worker groups into one round
+MAX_ATTEMPTS = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+# errors worth another attempt; anything else non-fatal is logged and dropped
+_RETRYABLE = (messaging.QuotaExceededError, messaging.ThirdPartyAuthError)
+_RETRYABLE_CODES = {'UNAVAILABLE', 'INTERNAL', 'DEADLINE_EXCEEDED', 'RESOURCE_EXHAUSTED'}
+# the token will never work again
+_DEAD_TOKEN = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+
+_Job = namedtuple('_Job', 'uids title body data attempt tokens')
+
+
+def _payload(title, body, data):
+    # FCM data values must be strings
+    return title, body, tuple(sorted((str(k), str(v)) for k, v in (data or {}).items()))
+
+
+class LocalMessagingClient:
+    """
+    Stand-in for firebase_admin.messaging: records what would be sent.
+    `unregistered` tokens fail as dead, and `flaky` maps a token to how many
+    sends fail with UNAVAILABLE before it succeeds.
+    """
+
+    _Response = namedtuple('_Response', 'success message_id exception')
+    _BatchResponse = namedtuple('_BatchResponse', 'responses success_count failure_count')
+
+    class UnavailableError(Exception):
+        code = 'UNAVAILABLE'
+
+    def __init__(self, unregistered=(), flaky=None):
+        self.unregistered = set(unregistered)
+        self.flaky = dict(flaky or {})
+        self.sent = []  # (token, title, body, data)
+        self._lock = threading.Lock()
+
+    def send_each_for_multicast(self, message):
+        responses = []
+        with self._lock:
+            for token in message.tokens:
+                if token in self.unregistered:
+                    exc = messaging.UnregisteredError('Requested entity was not found.')
+                    responses.append(self._Response(False, None, exc))
+                elif self.flaky.get(token, 0) > 0:
+                    self.flaky[token] -= 1
+                    responses.append(self._Response(False, None, self.UnavailableError('unavailable')))
+                else:
+                    n = message.notification
+                    self.sent.append((token, n.title, n.body, dict(message.data or {})))
+                    responses.append(self._Response(True, f'local-{len(self.sent)}', None))
+        ok = sum(1 for r in responses if r.success)
+        return self._BatchResponse(responses, ok, len(responses) - ok)
+
+
+def default_client():
+    if os.environ.get('PUSH_CLIENT') == 'local':
+        return LocalMessagingClient()
+    return messaging
+
+
+class PushQueue:
+    """Queue of push jobs served by a lazily started worker pool."""
+
+    def __init__(self, client=None, workers=PUSH_WORKERS, db=None):
+        self.client = client or default_client()
+        self.workers = workers
+        self._db = db
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._inflight = 0
+        self._idle = threading.Condition(self._lock)
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'pruned': 0}
+
+    @property
+    def db(self):
+        return self._db or firestore.client()
+
+    def enqueue(self, to_uid, title, body, data=None):
+        self._start()
+        with self._lock:
+            self._inflight += 1
+        self._queue.put(_Job((to_uid,), title, body, data or {}, 1, None))
+
+    def wait_idle(self, timeout=None):
+        """Block until every queued job (including pending retries) is finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._inflight:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._idle.wait(left)
+        return True
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _done(self, n=1):
+        with self._idle:
+            self._inflight -= n
+            if not self._inflight:
+                self._idle.notify_all()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f'push-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < DRAIN_LIMIT:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(jobs)
+
+    def _load_tokens(self, uid):
+        """[(token, doc ref)] for uid."""
+        out = []
+        for tk in self.db.collection('users').document(uid).collection('fcmTokens').stream():
+            token = tk.to_dict().get('token')
+            if token:
+                out.append((token, tk.reference))
+        return out
+
+    def _process(self, jobs):
+        groups = {}
+        for job in jobs:
+            groups.setdefault((_payload(job.title, job.body, job.data), job.attempt), []).append(job)
+
+        for ((title, body, data), attempt), group in groups.items():
+            try:
+                token_refs = []
+                for job in group:
+                    if job.tokens is not None:
+                        token_refs += job.tokens  # a retry carries only the tokens that failed
+                    else:
+                        for uid in job.uids:
+                            token_refs += self._load_tokens(uid)
+                retry = []
+                for start in range(0, len(token_refs), MULTICAST_LIMIT):
+                    retry += self._send(token_refs[start:start + MULTICAST_LIMIT], title, body, dict(data))
+                if retry:
+                    self._schedule_retry(_Job((), title, body, dict(data), attempt + 1, retry))
+            except Exception as e:
+                logger.warning("Push round failed: %s", e)
+            finally:
+                self._done(len(group))
+
+    def _send(self, token_refs, title, body, data):
+        """One multicast; prunes dead tokens and returns those worth retrying."""
+        msg = messaging.MulticastMessage(
+            notification=messaging.Notification(title=title, body=body),
+            data=data,
+            tokens=[t for t, _ in token_refs]
+        )
+        try:
+            resp = self.client.send_each_for_multicast(msg)
+        except Exception as e:
+            logger.warning("FCM multicast failed: %s", e)
+            return list(token_refs)
+
+        retry, dead = [], []
+        for (token, ref), r in zip(token_refs, resp.responses):
+            if r.success:
+                self._count('sent')
+            elif isinstance(r.exception, _DEAD_TOKEN):
+                dead.append(ref)
+            elif isinstance(r.exception, _RETRYABLE) or getattr(r.exception, 'code', None) in _RETRYABLE_CODES:
+                retry.append((token, ref))
+            else:
+                self._count('failed')
+                logger.warning("FCM send error: %s", r.exception)
+        if dead:
+            self._prune(dead)
+        return retry
+
+    def _prune(self, refs):
+        batch = self.db.batch()
+        for ref in refs:
+            batch.delete(ref)
+        try:
+            batch.commit()
+            self._count('pruned', len(refs))
+        except Exception as e:
+            logger.warning("Could not prune FCM tokens: %s", e)
+
+    def _schedule_retry(self, job):
+        if job.attempt > MAX_ATTEMPTS:
+            self._count('failed', len(job.tokens))
+            logger.warning("Giving up on %d FCM tokens after %d attempts", len(job.tokens), MAX_ATTEMPTS)
+            return
+        delay = min(BACKOFF_BASE_SECONDS * 2 ** (job.attempt - 2), BACKOFF_MAX_SECONDS)
+        delay *= random.uniform(0.5, 1.0)
+        self._count('retried', len(job.tokens))
+        with self._lock:
+            self._inflight += 1
+        timer = threading.Timer(delay, self._queue.put, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+
+push_queue = PushQueue()
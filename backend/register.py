@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from firebase_admin import firestore, auth
 from user_types import ALLOWED_USER_TYPES, USER_TYPE_DISPLAY_NAMES
+from handle_reservations import HandleTaken, claim_profile
 import logging
 
 register_bp = Blueprint('register_bp', __name__)
@@ -61,9 +62,14 @@ def register():
             'userType': user_type   # only canonical type
         }
 
-        # Save to Firestore
+        # Save to Firestore, reserving the username/phone in the same transaction
         db = firestore.client()
-        db.collection('users').document(data['uid']).set(user_data)
+        try:
+            claim_profile(db.transaction(), db, data['uid'], user_data, merge=False)
+        except HandleTaken as e:
+            return jsonify({'error': f'{e.field.title()} already taken'}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Set Firebase custom claims
         claims_success = set_user_custom_claims(data['uid'], user_type)
@@ -0,0 +1,397 @@
+# rsvp_counters.py
+# Sharded RSVP tallies for events.
+#
+# events/{eventId}/rsvpShards/{0..RSVP_SHARDS-1} = {'yes': n, 'no': n, 'maybe': n}
+# A status change picks a random shard and moves one count between fields in
+# the same transaction that writes rsvps/{uid}, so popular events do not
+# serialize on a single counter document. Shards are only ever written blindly
+# (Increment), never read inside the transaction, so they add no contention.
+# Readers do not sum the shards: a background flusher copies the totals of
+# events that saw RSVPs onto events/{eventId}.rsvpCounts every few seconds, so a
+# listing gets its tallies with the event docs it already read.
+#
+# Events with a capacity also get a sharded seat pool:
+# events/{eventId}/seatShards/{i} = {'capacity': c_i, 'taken': t_i}
+# A "yes" claims a seat from one shard at a time (random order), so concurrent
+# RSVPs contend on 1/SEAT_SHARDS of the pool and the sum of taken seats can
+# never exceed the capacity. When every shard is full the user is waitlisted
+# (events/{eventId}/waitlist/{uid}); a seat released by a cancellation is handed
+# to the oldest waiter inside the same transaction, and seats added by raising
+# the capacity go to waiters in joinedAt order before any newcomer can claim them.
+
+from firebase_admin import firestore
+from datetime import datetime
+import random
+import threading
+
+RSVP_STATUSES = ("yes", "no", "maybe")
+WAITLISTED = "waitlisted"
+COUNTED_STATUSES = RSVP_STATUSES + (WAITLISTED,)
+RSVP_SHARDS = 10
+SEAT_SHARDS = 10
+CLAIM_ROUNDS = 3         # claim/waitlist attempts before giving up
+PROMOTE_BATCH = 100      # waiters seated per transaction (2 writes each)
+MAX_BATCH_EVENTS = 100
+ROLLUP_INTERVAL_SECONDS = 5.0   # how often touched events get their rsvpCounts rolled up
+
+
+def shards_ref(event_ref):
+    return event_ref.collection("rsvpShards")
+
+
+def _shard_delta(transaction, event_ref, *moves):
+    """
+    Queue counter moves, each (old_status, new_status) with either side
+    possibly None, as a single write to one random shard.
+    """
+    net = {}
+    for old_status, new_status in moves:
+        if old_status == new_status:
+            continue
+        if old_status in COUNTED_STATUSES:
+            net[old_status] = net.get(old_status, 0) - 1
+        if new_status in COUNTED_STATUSES:
+            net[new_status] = net.get(new_status, 0) + 1
+    delta = {k: firestore.Increment(v) for k, v in net.items() if v}
+    if not delta:
+        return
+    shard = shards_ref(event_ref).document(str(random.randrange(RSVP_SHARDS)))
+    transaction.set(shard, delta, merge=True)
+
+
+@firestore.transactional
+def _set_rsvp(transaction, event_ref, uid, status, now):
+    rsvp_ref = event_ref.collection("rsvps").document(uid)
+    snap = rsvp_ref.get(transaction=transaction)
+    old_status = snap.to_dict().get("status") if snap.exists else None
+    _shard_delta(transaction, event_ref, (old_status, status))
+    transaction.set(rsvp_ref, {"user": uid, "status": status, "updatedAt": now})
+    return old_status
+
+
+def seats_ref(event_ref):
+    return event_ref.collection("seatShards")
+
+
+def waitlist_ref(event_ref):
+    return event_ref.collection("waitlist")
+
+
+def _split(total, parts):
+    """Spread total over parts as evenly as possible."""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def init_seats(batch, event_ref, capacity, taken=0):
+    """Queue the seat shards for a new capacity; `taken` seats start in shard 0."""
+    n = max(min(SEAT_SHARDS, capacity), 1)
+    caps = _split(capacity - taken, n)
+    for i, cap in enumerate(caps):
+        batch.set(seats_ref(event_ref).document(str(i)), {
+            "capacity": cap + (taken if i == 0 else 0),
+            "taken": taken if i == 0 else 0,
+        })
+
+
+def _seat_oldest_waiters(transaction, event_ref, free, now, limit=PROMOTE_BATCH):
+    """
+    Read the oldest waiters that fit in `free` ({shard_id: free seats}) and
+    queue their promotion. Returns (promoted uids, {shard_id: seats taken}); the
+    caller writes the shard counts. Must run before the transaction's first write.
+    """
+    free = {sid: n for sid, n in free.items() if n > 0}
+    if not free:
+        return [], {}
+    oldest = waitlist_ref(event_ref).order_by("joinedAt").limit(min(sum(free.values()), limit))
+    waiters = list(transaction.get(oldest))
+
+    promoted, seated = [], {}
+    for waiter, shard_id in zip(waiters, (sid for sid, n in free.items() for _ in range(n))):
+        promoted.append(waiter.id)
+        seated[shard_id] = seated.get(shard_id, 0) + 1
+        transaction.delete(waiter.reference)
+        transaction.set(event_ref.collection("rsvps").document(waiter.id), {
+            "user": waiter.id, "status": "yes", "seatShard": shard_id,
+            "promotedAt": now, "updatedAt": now,
+        })
+    _shard_delta(transaction, event_ref, *[(WAITLISTED, "yes")] * len(promoted))
+    return promoted, seated
+
+
+@firestore.transactional
+def _resize_seats(transaction, event_ref, capacity, now):
+    """Re-spread the free seats and give the first of them to waiters, atomically."""
+    shards = list(transaction.get(seats_ref(event_ref)))
+    taken = [s.to_dict().get("taken", 0) for s in shards]
+    if capacity < sum(taken):
+        raise ValueError(f"{sum(taken)} seats are already taken")
+    extra = _split(capacity - sum(taken), len(shards))
+    promoted, seated = _seat_oldest_waiters(
+        transaction, event_ref, {s.id: e for s, e in zip(shards, extra)}, now)
+    for snap, t, e in zip(shards, taken, extra):
+        transaction.update(snap.reference, {"capacity": t + e, "taken": t + seated.get(snap.id, 0)})
+    transaction.update(event_ref, {"capacity": capacity})
+    return promoted
+
+
+@firestore.transactional
+def _promote_waiters(transaction, event_ref, now):
+    """Seat the next batch of waiters in whatever seats are free. Returns their uids."""
+    shards = list(transaction.get(seats_ref(event_ref)))
+    free = {s.id: s.to_dict().get("capacity", 0) - s.to_dict().get("taken", 0) for s in shards}
+    promoted, seated = _seat_oldest_waiters(transaction, event_ref, free, now)
+    for shard_id, n in seated.items():
+        transaction.update(seats_ref(event_ref).document(shard_id), {"taken": firestore.Increment(n)})
+    return promoted
+
+
+def resize_seats(db, event_ref, capacity, seated_now=0, now=None):
+    """
+    Change an event's capacity. Seats already taken stay where they are and
+    the free seats are re-spread over the shards, then handed to waiters in
+    FIFO order. Raises ValueError if the new capacity is below the number of
+    seated attendees. `seated_now` seeds the pool for an event that had no
+    capacity before. Returns the uids promoted from the waitlist.
+    """
+    if not list(seats_ref(event_ref).limit(1).stream()):
+        if capacity < seated_now:
+            raise ValueError(f"{seated_now} seats are already taken")
+        batch = db.batch()
+        init_seats(batch, event_ref, capacity, taken=seated_now)
+        batch.update(event_ref, {"capacity": capacity})
+        batch.commit()
+        return []
+    # Waiters already queued go before anyone who RSVPs after the resize; the
+    # first PROMOTE_BATCH are seated in the resize itself, the rest right after
+    now = now or datetime.utcnow()
+    promoted = batch_promoted = _resize_seats(db.transaction(), event_ref, capacity, now)
+    while len(batch_promoted) == PROMOTE_BATCH:
+        batch_promoted = _promote_waiters(db.transaction(), event_ref, now)
+        promoted = promoted + batch_promoted
+    if promoted:
+        rollups.touch(event_ref.id)
+    return promoted
+
+
+@firestore.transactional
+def _claim_seat(transaction, event_ref, shard_ref, uid, now):
+    """Take a seat from one shard. Returns (old, new) or None if the shard is full."""
+    rsvp_ref = event_ref.collection("rsvps").document(uid)
+    snap = rsvp_ref.get(transaction=transaction)
+    old_status = snap.to_dict().get("status") if snap.exists else None
+    if old_status in ("yes", WAITLISTED):
+        # already seated, or queued: waiters do not jump the line
+        return old_status, old_status
+    shard = shard_ref.get(transaction=transaction)
+    if not shard.exists:
+        return None
+    seats = shard.to_dict()
+    if seats.get("taken", 0) >= seats.get("capacity", 0):
+        return None
+    transaction.update(shard_ref, {"taken": firestore.Increment(1)})
+    _shard_delta(transaction, event_ref, (old_status, "yes"))
+    transaction.set(rsvp_ref, {"user": uid, "status": "yes", "seatShard": shard_ref.id, "updatedAt": now})
+    return old_status, "yes"
+
+
+@firestore.transactional
+def _join_waitlist(transaction, event_ref, uid, now):
+    """Queue uid. Returns (old, new), or None if a seat freed up meanwhile."""
+    rsvp_ref = event_ref.collection("rsvps").document(uid)
+    snap = rsvp_ref.get(transaction=transaction)
+    old_status = snap.to_dict().get("status") if snap.exists else None
+    if old_status in ("yes", WAITLISTED):
+        return old_status, old_status
+    # re-check the whole pool so a seat released after our claims is not missed
+    for shard in transaction.get(seats_ref(event_ref)):
+        seats = shard.to_dict()
+        if seats.get("taken", 0) < seats.get("capacity", 0):
+            return None
+    _shard_delta(transaction, event_ref, (old_status, WAITLISTED))
+    transaction.set(waitlist_ref(event_ref).document(uid), {"user": uid, "joinedAt": now})
+    transaction.set(rsvp_ref, {"user": uid, "status": WAITLISTED, "updatedAt": now})
+    return old_status, WAITLISTED
+
+
+@firestore.transactional
+def _leave_seat(transaction, event_ref, uid, status, now):
+    """
+    Move uid to no/maybe. A released seat goes straight to the oldest waiter.
+    Returns (old, new, promoted_uid).
+    """
+    rsvp_ref = event_ref.collection("rsvps").document(uid)
+    snap = rsvp_ref.get(transaction=transaction)
+    rsvp = snap.to_dict() if snap.exists else {}
+    old_status = rsvp.get("status")
+    promoted = None
+    moves = [(old_status, status)]
+
+    if old_status == "yes":
+        # attendees seated before the capacity existed are counted in shard 0
+        shard_ref = seats_ref(event_ref).document(rsvp.get("seatShard", "0"))
+        oldest = waitlist_ref(event_ref).order_by("joinedAt").limit(1)
+        waiters = list(transaction.get(oldest))
+        if waiters:
+            promoted = waiters[0].id
+            transaction.delete(waiters[0].reference)
+            transaction.set(event_ref.collection("rsvps").document(promoted), {
+                "user": promoted, "status": "yes", "seatShard": shard_ref.id,
+                "promotedAt": now, "updatedAt": now,
+            })
+            moves.append((WAITLISTED, "yes"))
+        else:
+            transaction.update(shard_ref, {"taken": firestore.Increment(-1)})
+    elif old_status == WAITLISTED:
+        transaction.delete(waitlist_ref(event_ref).document(uid))
+
+    _shard_delta(transaction, event_ref, *moves)
+    transaction.set(rsvp_ref, {"user": uid, "status": status, "updatedAt": now})
+    return old_status, status, promoted
+
+
+def set_rsvp(db, event_ref, uid, status, now, capacity=None):
+    """
+    Write uid's RSVP and its tally change atomically.
+    Returns (previous_status, new_status, promoted_uid). With a capacity, a
+    "yes" may come back as WAITLISTED, and leaving may promote a waiter.
+    """
+    result = _write_rsvp(db, event_ref, uid, status, now, capacity)
+    rollups.touch(event_ref.id)
+    return result
+
+
+def _write_rsvp(db, event_ref, uid, status, now, capacity):
+    if not capacity:
+        return _set_rsvp(db.transaction(), event_ref, uid, status, now), status, None
+    if status != "yes":
+        return _leave_seat(db.transaction(), event_ref, uid, status, now)
+
+    # the pool keeps the shards it was created with even if capacity drops
+    # below SEAT_SHARDS later, so claim from the shards that actually exist
+    shard_ids = [s.id for s in seats_ref(event_ref).select([]).stream()] \
+        or [str(i) for i in range(max(min(SEAT_SHARDS, capacity), 1))]
+    for _ in range(CLAIM_ROUNDS):
+        random.shuffle(shard_ids)
+        for shard_id in shard_ids:
+            result = _claim_seat(db.transaction(), event_ref, seats_ref(event_ref).document(shard_id), uid, now)
+            if result is not None:
+                return result[0], result[1], None
+        result = _join_waitlist(db.transaction(), event_ref, uid, now)
+        if result is not None:
+            return result[0], result[1], None
+    raise RuntimeError("Could not claim a seat or join the waitlist; try again")
+
+
+def _empty_counts():
+    return {s: 0 for s in COUNTED_STATUSES}
+
+
+def shard_counts(db, event_ids):
+    """Exact tallies summed from the shards: {eventId: counts}. One get_all."""
+    out = {eid: _empty_counts() for eid in event_ids}
+    refs = [shards_ref(db.collection("events").document(eid)).document(str(i))
+            for eid in event_ids for i in range(RSVP_SHARDS)]
+    for snap in (db.get_all(refs) if refs else []):
+        if snap.exists:
+            # .../events/{eid}/rsvpShards/{i}
+            counts = out[snap.reference.parent.parent.id]
+            data = snap.to_dict()
+            for s in COUNTED_STATUSES:
+                counts[s] += data.get(s, 0)
+    return out
+
+
+def rsvp_summaries(db, event_ids, uid=None, events=None):
+    """
+    {eventId: {'counts': {...}, 'myStatus': str|None}} for many events. Counts
+    are the rolled-up events/{id}.rsvpCounts, taken from `events` ({id: dict})
+    when the caller already holds the docs, else from one projected get_all;
+    only events never rolled up fall back to their shards. The caller's own
+    RSVP docs come from one more get_all.
+    """
+    out = {eid: {"counts": _empty_counts(), "myStatus": None} for eid in event_ids}
+    if not event_ids:
+        return out
+    if events is None:
+        refs = [db.collection("events").document(eid) for eid in event_ids]
+        events = {s.id: s.to_dict() or {} for s in db.get_all(refs, field_paths=["rsvpCounts"]) if s.exists}
+
+    missing = []
+    for eid in event_ids:
+        rolled_up = (events.get(eid) or {}).get("rsvpCounts")
+        if rolled_up is None:
+            missing.append(eid)
+        else:
+            out[eid]["counts"].update({s: rolled_up.get(s, 0) for s in COUNTED_STATUSES})
+    for eid, counts in shard_counts(db, missing).items():
+        out[eid]["counts"] = counts
+
+    if uid:
+        refs = [db.collection("events").document(eid).collection("rsvps").document(uid) for eid in event_ids]
+        for snap in db.get_all(refs):
+            if snap.exists:
+                # .../events/{eid}/rsvps/{uid}
+                out[snap.reference.parent.parent.id]["myStatus"] = snap.to_dict().get("status")
+    return out
+
+
+class _RollupQueue:
+    """Ids of events whose shards changed since their rsvpCounts were last written."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = set()
+
+    def touch(self, event_id):
+        with self._lock:
+            self._dirty.add(event_id)
+
+    def drain(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return sorted(dirty)
+
+    def requeue(self, event_ids):
+        with self._lock:
+            self._dirty.update(event_ids)
+
+
+rollups = _RollupQueue()
+
+
+def flush_rollups(db, queue=rollups):
+    """Write the shard totals of touched events onto their rsvpCounts. Returns events written."""
+    event_ids = queue.drain()
+    written = 0
+    for start in range(0, len(event_ids), MAX_BATCH_EVENTS):
+        try:
+            chunk = shard_counts(db, event_ids[start:start + MAX_BATCH_EVENTS])
+        except Exception as e:
+            print(f"Error reading RSVP shards: {str(e)}")
+            queue.requeue(event_ids[start:])
+            break
+        batch = db.batch()
+        for eid, counts in chunk.items():
+            batch.update(db.collection("events").document(eid), {"rsvpCounts": counts})
+        try:
+            batch.commit()
+            written += len(chunk)
+        except Exception:
+            # one deleted event fails the whole batch: write the rest one by one
+            for eid, counts in chunk.items():
+                try:
+                    db.collection("events").document(eid).update({"rsvpCounts": counts})
+                    written += 1
+                except Exception as e:
+                    print(f"Error rolling up RSVPs for event {eid}: {str(e)}")
+    return written
+
+
+def rsvp_rollup_flusher(socketio, queue=rollups):
+    """Background task: periodically roll up the tallies of events with new RSVPs."""
+    while True:
+        socketio.sleep(ROLLUP_INTERVAL_SECONDS)
+        try:
+            flush_rollups(firestore.client(), queue)
+        except Exception as e:
+            print(f"Error in RSVP rollup flusher: {str(e)}")
@@ -53,7 +53,7 @@ def get_sentiment_matches():
     db = firestore.client()
 
     # Load current user's petProfile
-    user_snap = db.collection('users').document(uid).get()
+    user_snap = db.collection('users').document(uid).get(field_paths=['petProfile'])
     if not user_snap.exists:
         return jsonify({'error': 'User not found'}), 404
 
@@ -71,7 +71,7 @@ def get_sentiment_matches():
 
     matches = []
     # Iterate all other users
-    for doc in db.collection('users').stream():
+    for doc in db.collection('users').select(['petProfile']).stream():
         other_uid = doc.id
         if other_uid == uid:
             continue
@@ -0,0 +1,103 @@
+# session_bootstrap.py
+# One call for everything the client needs at startup.
+#
+# Replaces the /login, /current_user, /user/profile, /pet-characteristics,
+# /requests and /chats round trips on app load: the token is verified once, the
+# user document is read once, and the pending-request counts (aggregation
+# queries) are gathered concurrently with it. Responses carry an ETag, so a
+# client revalidating an unchanged bootstrap gets an empty 304.
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from firebase_admin import auth, firestore
+from concurrent.futures import ThreadPoolExecutor
+from user_types import ALLOWED_USER_TYPES
+from group_chats import group_unread_total
+
+bootstrap_bp = Blueprint('bootstrap_bp', __name__)
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='bootstrap')
+
+# bookkeeping fields the client never needs on startup
+HIDDEN_FIELDS = ('incomingRequests', 'outgoingRequests', 'friends', 'blockedUsers')
+
+
+def _count(query):
+    """Server-side count: one aggregation instead of streaming the docs."""
+    result = query.count().get()
+    return int(result[0][0].value) if result and result[0] else 0
+
+
+def _pending_count(db, side, uid):
+    return _count(db.collection('requests').where(side, '==', uid).where('status', '==', 'pending'))
+
+
+def _role(decoded, user_data):
+    """Custom claim first (set at registration), then the profile field."""
+    role = decoded.get('userType') or user_data.get('userType')
+    return role if role in ALLOWED_USER_TYPES else 'pet_parent'
+
+
+@bootstrap_bp.route('/session/bootstrap', methods=['GET', 'OPTIONS'])
+@cross_origin(expose_headers=['ETag'])
+def session_bootstrap():
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    token_header = request.headers.get('Authorization', '')
+    parts = token_header.split()
+    if len(parts) != 2 or parts[0] != 'Bearer':
+        return jsonify({'error': 'Missing token'}), 401
+    try:
+        decoded = auth.verify_id_token(parts[1])
+    except Exception as e:
+        return jsonify({'error': 'Invalid token: ' + str(e)}), 401
+    uid = decoded['uid']
+
+    db = firestore.client()
+    user_future = _executor.submit(db.collection('users').document(uid).get)
+    incoming_future = _executor.submit(_pending_count, db, 'to', uid)
+    outgoing_future = _executor.submit(_pending_count, db, 'from', uid)
+    group_unread_future = _executor.submit(group_unread_total, db, uid)
+
+    user_doc = user_future.result()
+    if not user_doc.exists:
+        return jsonify({'error': 'User not found'}), 404
+    user_data = user_doc.to_dict()
+    # Flatten any accidental wrap (see login.py)
+    if "user" in user_data:
+        user_data = {**user_data["user"], **{k: v for k, v in user_data.items() if k != "user"}}
+
+    try:
+        incoming, outgoing = incoming_future.result(), outgoing_future.result()
+    except Exception as e:
+        print(f"Error counting requests for bootstrap: {str(e)}")
+        incoming = outgoing = None
+    try:
+        group_unread = group_unread_future.result()
+    except Exception as e:
+        print(f"Error counting group unread for bootstrap: {str(e)}")
+        group_unread = 0
+
+    pet_profile = user_data.get('petProfile') or None
+    profile = {k: v for k, v in user_data.items() if k not in HIDDEN_FIELDS}
+    profile['uid'] = uid
+    profile['email'] = decoded.get('email', user_data.get('email', ''))
+
+    response = jsonify({
+        'user': profile,
+        'role': _role(decoded, user_data),
+        'petProfile': pet_profile,
+        'characteristics': (pet_profile or {}).get('characteristics', []),
+        'profileCompleted': bool(user_data.get('profileCompleted')),
+        'requests': {'incomingPending': incoming, 'outgoingPending': outgoing},
+        'unread': {
+            # direct chats are stored on the user doc, groups are derived per member
+            'chats': max(user_data.get('unreadTotal', 0), 0) + group_unread,
+            'notifications': max(user_data.get('notificationsUnread', 0), 0),
+        },
+    })
+    # private: per-user data; no-cache: always revalidate with If-None-Match
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
@@ -2,11 +2,29 @@ from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from flask_socketio import emit, join_room, leave_room
 from firebase_admin import auth, firestore
-from datetime import datetime
+from datetime import datetime, timezone
 import json
+from chat_typing import typing_tracker, typing_sweeper
+from presence import (
+    presence_registry, presence_flusher, broadcast_presence,
+    load_friend_uids, user_room
+)
+from group_chats import (
+    MAX_GROUP_MEMBERS, MEMBER_PAGE_SIZE, MAX_MEMBER_PAGE, MAX_MEMBERS_PER_ADD, ROLES,
+    members_ref, add_members, add_members_capped, get_member, is_member, member_chat_ids,
+    page_members, hydrate_users, fan_out_group_message, group_unread_total
+)
+from chat_search import SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE, index_message, search
+from friendships import FRIENDS_PAGE_SIZE, MAX_FRIENDS_PAGE, page_friend_uids
+from data_access import get_doc, get_docs
 
 chat_bp = Blueprint('chat_bp', __name__)
 
+# Firestore returns tz-aware timestamps; chats without lastUpdated sort last
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+FRIEND_FIELDS = ['displayName', 'petProfile.name', 'petProfile.image', 'isOnline', 'lastSeen']
+
 # Initialize SocketIO (you'll need to pass this from your main app)
 # In your main Flask app file, add: socketio = SocketIO(app, cors_allowed_origins="*")
 # Then pass it here or import it
@@ -27,8 +45,11 @@ def _get_user_uid_from_token(token):
     except:
         return None
 
+# one projection for both helpers, so the second lookup is served by the identity map
+USER_CARD_FIELDS = ['displayName', 'petProfile.name', 'petProfile.image']
+
 def _get_display_name(db, uid):
-    user_doc = db.collection('users').document(uid).get()
+    user_doc = get_doc(db.collection('users').document(uid), USER_CARD_FIELDS)
     if user_doc.exists:
         data = user_doc.to_dict()
         # Prefer petProfile.name, then displayName, then UID
@@ -36,7 +57,7 @@ def _get_display_name(db, uid):
     return uid
 
 def _get_pet_avatar(db, uid):
-    user_doc = db.collection('users').document(uid).get()
+    user_doc = get_doc(db.collection('users').document(uid), USER_CARD_FIELDS)
     if user_doc.exists:
         return user_doc.to_dict().get('petProfile', {}).get('image')
     return None
@@ -63,6 +84,15 @@ def _get_last_message(db, chat_id):
         print(f"Error getting last message: {e}")
     return None
 
+def _presence_fields(uid, user_data):
+    """Live presence if this process knows the user, else the persisted fields"""
+    if presence_registry.known(uid):
+        return presence_registry.status(uid)
+    return {
+        'isOnline': user_data.get('isOnline', False),
+        'lastSeen': user_data.get('lastSeen')
+    }
+
 @chat_bp.route('/chats', methods=['GET', 'POST', 'OPTIONS'])
 @cross_origin()
 def chats():
@@ -81,24 +111,52 @@ def chats():
               .where('participants', 'array_contains', uid)
               .order_by('lastUpdated', direction=firestore.Query.DESCENDING)
         )
-        snaps = query.stream()
+        snaps = list(query.stream())
+
+        # Groups keep membership in a subcollection: find them via the member docs
+        memberships = dict(member_chat_ids(db, uid))
+        if memberships:
+            refs = [db.collection('chats').document(cid) for cid in memberships]
+            snaps += [s for s in db.get_all(refs) if s.exists]
+            snaps.sort(key=lambda s: s.to_dict().get('lastUpdated') or _EPOCH, reverse=True)
+
+        # One get_all for every direct-chat partner; the name/avatar helpers
+        # below are then served from the identity map
+        partners = {u for s in snaps for u in s.to_dict().get('participants', []) if u != uid}
+        get_docs(db, [db.collection('users').document(u) for u in partners], USER_CARD_FIELDS)
+
         chats = []
         for snap in snaps:
             c = snap.to_dict()
             c['id'] = snap.id
-            other_uids = [u for u in c.get('participants', []) if u != uid]
-            
-            # Show display name (prefer petProfile.name)
-            other_names = []
-            for ouid in other_uids:
-                other_names.append(_get_display_name(db, ouid))
-            
-            c['otherUserName'] = ", ".join(other_names)
-            c['otherUserUid'] = other_uids[0] if other_uids else None
-            c['otherUserAvatar'] = _get_pet_avatar(db, c['otherUserUid'])
-            
-            # Get last message
-            last_msg = _get_last_message(db, snap.id)
+
+            if snap.id in memberships:
+                member = memberships[snap.id]
+                c['otherUserName'] = c.get('name') or 'Group chat'
+                c['otherUserUid'] = None
+                c['otherUserAvatar'] = c.get('image')
+                c['role'] = member.get('role')
+                c['unreadCount'] = max(c.get('messageCount', 0) - member.get('lastReadCount', 0), 0)
+                c['readUpTo'] = member.get('readUpTo')
+            else:
+                other_uids = [u for u in c.get('participants', []) if u != uid]
+
+                # Show display name (prefer petProfile.name)
+                other_names = []
+                for ouid in other_uids:
+                    other_names.append(_get_display_name(db, ouid))
+
+                c['otherUserName'] = ", ".join(other_names)
+                c['otherUserUid'] = other_uids[0] if other_uids else None
+                c['otherUserAvatar'] = _get_pet_avatar(db, c['otherUserUid'])
+
+                # Unread state is maintained incrementally, no message scan needed
+                c['unreadCount'] = c.get('unread', {}).get(uid, 0)
+                c['readUpTo'] = c.get('readUpTo', {}).get(uid)
+
+            # Last message is kept on the chat doc by the send path; older chats
+            # written before that fall back to a query
+            last_msg = c.get('lastMessage') or _get_last_message(db, snap.id)
             c['lastMessage'] = last_msg
             
             # Format last message text for preview
@@ -121,13 +179,33 @@ def chats():
     if uid not in participants:
         participants.append(uid)
     is_group = bool(data.get('isGroup'))
-    new_chat = {
-        'participants': participants,
-        'isGroup': is_group,
-        'lastUpdated': datetime.utcnow()
-    }
+    if not is_group and len(set(participants)) == 2:
+        other_uid = next(p for p in participants if p != uid)
+        chat_id, created = get_or_create_direct_chat(db, uid, other_uid)
+        return jsonify({'chatId': chat_id}), 201 if created else 200
+    if not is_group:
+        return jsonify({'error': '1-1 chats need exactly one other participant'}), 400
+
+    # Group chat: membership goes into chats/{id}/members, not an array
+    if not isinstance(participants, list) or not all(isinstance(p, str) and p for p in participants):
+        return jsonify({'error': 'participants must be a list of uids'}), 400
+    member_uids = sorted(set(participants) - {uid})
+    if len(member_uids) + 1 > MAX_GROUP_MEMBERS:
+        return jsonify({'error': f'Groups are limited to {MAX_GROUP_MEMBERS} members'}), 400
+
+    now = datetime.utcnow()
     chat_ref = db.collection('chats').document()
-    chat_ref.set(new_chat)
+    chat_ref.set({
+        'isGroup': True,
+        'name': (data.get('name') or '').strip(),
+        'image': data.get('image'),
+        'createdBy': uid,
+        'memberCount': len(member_uids) + 1,
+        'messageCount': 0,
+        'lastUpdated': now
+    })
+    add_members(db, chat_ref.id, [uid], role='owner', joined_at=now)
+    add_members(db, chat_ref.id, member_uids, joined_at=now)
     return jsonify({'chatId': chat_ref.id}), 201
 
 @chat_bp.route('/friends', methods=['GET', 'OPTIONS'])
@@ -141,46 +219,45 @@ def get_friends():
     if not uid:
         return jsonify({'error': 'Unauthorized'}), 401
 
+    try:
+        limit = min(int(request.args.get('limit', FRIENDS_PAGE_SIZE)), MAX_FRIENDS_PAGE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    cursor = request.args.get('cursor')
+
     db = firestore.client()
     
     try:
-        # Get current user's friends from their document
-        user_doc = db.collection('users').document(uid).get()
+        # Friendship edges, then one projected get_all for the page of friends
+        friend_uids, next_cursor = page_friend_uids(db, uid, max(limit, 1), cursor)
+        users = hydrate_users(db, friend_uids, FRIEND_FIELDS)
         friends_list = []
-        
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            friends_uids = user_data.get('friends', [])
-            
-            # Get friend details
-            for friend_uid in friends_uids:
-                friend_doc = db.collection('users').document(friend_uid).get()
-                if friend_doc.exists:
-                    friend_data = friend_doc.to_dict()
-                    friends_list.append({
-                        'uid': friend_uid,
-                        'displayName': _get_display_name(db, friend_uid),
-                        'avatar': _get_pet_avatar(db, friend_uid),
-                        'isOnline': friend_data.get('isOnline', False),
-                        'lastSeen': friend_data.get('lastSeen')
-                    })
+        for friend_uid in friend_uids:
+            if friend_uid not in users:
+                continue
+            friend_data = users[friend_uid]
+            friends_list.append({
+                'uid': friend_uid,
+                'displayName': friend_data.get('petProfile', {}).get('name') or friend_data.get('displayName') or friend_uid,
+                'avatar': friend_data.get('petProfile', {}).get('image'),
+                **_presence_fields(friend_uid, friend_data)
+            })
         
         # If no friends found, get some sample users (for demo purposes)
-        if not friends_list:
+        if not friends_list and not cursor:
             # Get all users except current user (limit to 20 for performance)
-            users_query = db.collection('users').limit(20).stream()
+            users_query = db.collection('users').select(FRIEND_FIELDS).limit(20).stream()
             for user_doc in users_query:
                 if user_doc.id != uid:
                     user_data = user_doc.to_dict()
                     friends_list.append({
                         'uid': user_doc.id,
-                        'displayName': _get_display_name(db, user_doc.id),
-                        'avatar': _get_pet_avatar(db, user_doc.id),
-                        'isOnline': user_data.get('isOnline', False),
-                        'lastSeen': user_data.get('lastSeen')
+                        'displayName': user_data.get('petProfile', {}).get('name') or user_data.get('displayName') or user_doc.id,
+                        'avatar': user_data.get('petProfile', {}).get('image'),
+                        **_presence_fields(user_doc.id, user_data)
                     })
         
-        return jsonify({'friends': friends_list}), 200
+        return jsonify({'friends': friends_list, 'nextCursor': next_cursor}), 200
         
     except Exception as e:
         print(f"Error getting friends: {e}")
@@ -198,8 +275,9 @@ def messages(chat_id):
 
     db = firestore.client()
     chat_doc = db.collection('chats').document(chat_id).get()
-    if not chat_doc.exists or uid not in chat_doc.to_dict().get('participants', []):
+    if not chat_doc.exists or not is_member(db, chat_id, chat_doc.to_dict(), uid):
         return jsonify({'error': 'Forbidden'}), 403
+    chat_data = chat_doc.to_dict()
 
     if request.method == 'GET':
         query = (
@@ -208,7 +286,10 @@ def messages(chat_id):
               .collection('messages')
               .order_by('sentAt', direction=firestore.Query.ASCENDING)
         )
-        snaps = query.stream()
+        snaps = list(query.stream())
+        # authors in one get_all; _get_display_name then reads from the identity map
+        authors = {s.to_dict().get('from') for s in snaps} - {None, ''}
+        get_docs(db, [db.collection('users').document(a) for a in authors], USER_CARD_FIELDS)
         messages = []
         for snap in snaps:
             m = snap.to_dict()
@@ -234,12 +315,35 @@ def messages(chat_id):
           .collection('messages')
           .document()
     )
-    msg_ref.set(msg)
 
-    # Update chat's lastUpdated timestamp
-    db.collection('chats').document(chat_id).update({
-        'lastUpdated': datetime.utcnow()
-    })
+    # Message, chat summary and unread counters go out in one batch; the search
+    # index is written after it and can never fail the send
+    chat_update = {
+        'lastUpdated': msg['sentAt'],
+        'lastMessage': {'text': text, 'sentAt': msg['sentAt'], 'from': uid}
+    }
+    batch = db.batch()
+    batch.set(msg_ref, msg)
+    is_member_group = 'participants' not in chat_data
+    if is_member_group:
+        # O(1) writes regardless of group size: members derive unread from messageCount
+        chat_update['messageCount'] = firestore.Increment(1)
+        batch.update(members_ref(db, chat_id).document(uid), {
+            'lastReadCount': firestore.Increment(1),
+            'readUpTo': msg['sentAt']
+        })
+    else:
+        if chat_data.get('unread', {}).get(uid):
+            # Replying reads the chat: clear the counter and the badge together
+            _mark_read(db.transaction(), db, db.collection('chats').document(chat_id), uid, msg['sentAt'])
+        chat_update[f'readUpTo.{uid}'] = msg['sentAt']
+        for other_uid in [p for p in chat_data.get('participants', []) if p != uid]:
+            chat_update[f'unread.{other_uid}'] = firestore.Increment(1)
+            batch.set(db.collection('users').document(other_uid),
+                      {'unreadTotal': firestore.Increment(1)}, merge=True)
+    batch.update(db.collection('chats').document(chat_id), chat_update)
+    batch.commit()
+    index_message(db, chat_id, msg_ref.id, text, msg['sentAt'])
 
     # NEW: Broadcast message to all users in the chat room via Socket.IO
     from flask import current_app
@@ -248,6 +352,7 @@ def messages(chat_id):
         # Prepare message data for broadcasting
         broadcast_msg = {
             'id': msg_ref.id,
+            'chatId': chat_id,
             'from': uid,
             'text': text,
             'sentAt': msg['sentAt'].isoformat(),
@@ -258,8 +363,212 @@ def messages(chat_id):
         socketio.emit('new_message', broadcast_msg, room=f'chat_{chat_id}')
         print(f"📤 Broadcasting message to room: chat_{chat_id}")
 
+        # Members outside the room are notified in bounded batches off-thread
+        if is_member_group:
+            socketio.start_background_task(fan_out_group_message, socketio, chat_id, uid, text[:100])
+
     return jsonify({'messageId': msg_ref.id}), 201
 
+@chat_bp.route('/chats/<chat_id>/search', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def search_messages(chat_id):
+    """Ranked, paginated search within one chat: ?q=...&limit=20&cursor=<offset>"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    uid = _get_user_uid(request)
+    if not uid:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    db = firestore.client()
+    chat_doc = db.collection('chats').document(chat_id).get()
+    if not chat_doc.exists or not is_member(db, chat_id, chat_doc.to_dict(), uid):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    try:
+        limit = max(min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE), 1)
+        offset = max(int(request.args.get('cursor') or 0), 0)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+
+    hits, total = search(db, chat_id, request.args.get('q', ''), limit, offset)
+    msg_col = db.collection('chats').document(chat_id).collection('messages')
+    snaps = {s.id: s for s in db.get_all([msg_col.document(mid) for mid, _, _ in hits]) if s.exists} if hits else {}
+
+    results = []
+    for mid, score, _ in hits:
+        snap = snaps.get(mid)
+        if not snap:
+            continue
+        m = snap.to_dict()
+        m['id'] = mid
+        m['score'] = score
+        results.append(m)
+
+    next_cursor = str(offset + limit) if offset + limit < total else None
+    return jsonify({'results': results, 'total': total, 'nextCursor': next_cursor}), 200
+
+@firestore.transactional
+def _mark_read(transaction, db, chat_ref, uid, read_at):
+    """Reset uid's unread counter on a chat and take it off their badge total"""
+    snap = chat_ref.get(transaction=transaction)
+    if not snap.exists:
+        return None
+    chat_data = snap.to_dict()
+    if 'participants' not in chat_data:
+        # Group chat: catch the member's read count up with the chat's
+        member = get_member(db, chat_ref.id, uid, transaction=transaction)
+        if member is None:
+            return None
+        message_count = chat_data.get('messageCount', 0)
+        transaction.update(members_ref(db, chat_ref.id).document(uid), {
+            'lastReadCount': message_count,
+            'readUpTo': read_at
+        })
+        return max(message_count - member.get('lastReadCount', 0), 0)
+    if uid not in chat_data.get('participants', []):
+        return None
+    unread = chat_data.get('unread', {}).get(uid, 0)
+    transaction.update(chat_ref, {
+        f'unread.{uid}': 0,
+        f'readUpTo.{uid}': read_at
+    })
+    if unread:
+        transaction.set(db.collection('users').document(uid),
+                        {'unreadTotal': firestore.Increment(-unread)}, merge=True)
+    return unread
+
+def mark_chat_read(db, chat_id, uid):
+    """Returns the receipt dict, or None if uid cannot read this chat"""
+    read_at = datetime.utcnow()
+    chat_ref = db.collection('chats').document(chat_id)
+    cleared = _mark_read(db.transaction(), db, chat_ref, uid, read_at)
+    if cleared is None:
+        return None
+    return {'chatId': chat_id, 'userId': uid, 'readUpTo': read_at.isoformat(), 'cleared': cleared}
+
+@chat_bp.route('/chats/<chat_id>/read', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def read_chat(chat_id):
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    uid = _get_user_uid(request)
+    if not uid:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    receipt = mark_chat_read(firestore.client(), chat_id, uid)
+    if receipt is None:
+        return jsonify({'error': 'Forbidden'}), 403
+
+    from flask import current_app
+    socketio = current_app.extensions.get('socketio')
+    if socketio:
+        socketio.emit('read_receipt', receipt, room=f'chat_{chat_id}')
+    return jsonify(receipt), 200
+
+@chat_bp.route('/chats/<chat_id>/members', methods=['GET', 'POST', 'OPTIONS'])
+@cross_origin()
+def chat_members(chat_id):
+    """Paged group members with display data, or add members (owner/admin)"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    uid = _get_user_uid(request)
+    if not uid:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    db = firestore.client()
+    chat_ref = db.collection('chats').document(chat_id)
+    chat_doc = chat_ref.get()
+    if not chat_doc.exists or 'participants' in chat_doc.to_dict():
+        return jsonify({'error': 'Not a group chat'}), 404
+    me = get_member(db, chat_id, uid)
+    if me is None:
+        return jsonify({'error': 'Forbidden'}), 403
+
+    if request.method == 'GET':
+        try:
+            limit = min(int(request.args.get('limit', MEMBER_PAGE_SIZE)), MAX_MEMBER_PAGE)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        members, next_cursor = page_members(db, chat_id, max(limit, 1), request.args.get('cursor'))
+        users = hydrate_users(db, [m['uid'] for m in members])
+        out = []
+        for m in members:
+            u = users.get(m['uid'], {})
+            out.append({
+                'uid': m['uid'],
+                'role': m.get('role'),
+                'joinedAt': m.get('joinedAt'),
+                'displayName': u.get('petProfile', {}).get('name') or u.get('displayName') or m['uid'],
+                'avatar': u.get('petProfile', {}).get('image')
+            })
+        return jsonify({'members': out, 'nextCursor': next_cursor}), 200
+
+    # POST → add members
+    if me.get('role') not in ('owner', 'admin'):
+        return jsonify({'error': 'Only group owners and admins can add members'}), 403
+    data = request.json or {}
+    new_uids = data.get('uids', [])
+    role = data.get('role', 'member')
+    if not isinstance(new_uids, list) or not new_uids or role not in ROLES[1:]:
+        return jsonify({'error': 'uids (list) and a valid role required'}), 400
+    new_uids = sorted(set(new_uids))
+    if len(new_uids) > MAX_MEMBERS_PER_ADD:
+        return jsonify({'error': f'At most {MAX_MEMBERS_PER_ADD} members per request'}), 400
+
+    # Cap check and member writes share a transaction so concurrent adds cannot overshoot
+    try:
+        to_add = add_members_capped(db.transaction(), db, chat_id, new_uids, role=role)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'added': to_add}), 200
+
+@chat_bp.route('/chats/unread-count', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def unread_count():
+    """Total unread messages across all chats: the stored direct-chat total plus derived group unread"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    uid = _get_user_uid(request)
+    if not uid:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    db = firestore.client()
+    user_doc = db.collection('users').document(uid).get(field_paths=['unreadTotal'])
+    total = user_doc.to_dict().get('unreadTotal', 0) if user_doc.exists else 0
+    return jsonify({'unreadTotal': max(total, 0) + group_unread_total(db, uid)}), 200
+
+def direct_chat_id(uid_a, uid_b):
+    """Canonical id for the 1-1 chat between two users (order-agnostic)"""
+    low, high = sorted([uid_a, uid_b])
+    return f'dm_{low}_{high}'
+
+@firestore.transactional
+def _create_chat_if_absent(transaction, chat_ref, data):
+    snap = chat_ref.get(transaction=transaction)
+    if snap.exists:
+        return False
+    transaction.create(chat_ref, data)
+    return True
+
+def get_or_create_direct_chat(db, uid_a, uid_b):
+    """
+    Return (chat_id, created) for the 1-1 chat between uid_a and uid_b.
+    One document read when the chat exists; a create-if-absent transaction otherwise.
+    """
+    chat_ref = db.collection('chats').document(direct_chat_id(uid_a, uid_b))
+    if chat_ref.get().exists:
+        return chat_ref.id, False
+    created = _create_chat_if_absent(db.transaction(), chat_ref, {
+        'participants': sorted([uid_a, uid_b]),
+        'isGroup': False,
+        'lastUpdated': datetime.utcnow()
+    })
+    return chat_ref.id, created
+
 # -- NEW: Find or create a chat with another user (1-1 only) --
 @chat_bp.route('/chat-with-user/<friend_uid>', methods=['POST', 'OPTIONS'])
 @cross_origin()
@@ -272,23 +581,22 @@ def chat_with_user(friend_uid):
         return jsonify({'error': 'Unauthorized or bad friend UID'}), 401
 
     db = firestore.client()
-    # Find existing 1-1 chat (order-agnostic)
-    existing = db.collection('chats') \
-        .where('participants', 'array_contains', uid) \
-        .where('isGroup', '==', False) \
-        .stream()
-    for chat in existing:
-        chat_data = chat.to_dict()
-        if set(chat_data.get('participants', [])) == set([uid, friend_uid]):
-            return jsonify({'chatId': chat.id}), 200
-    # Otherwise, create
-    chat_ref = db.collection('chats').document()
-    chat_ref.set({
-        'participants': [uid, friend_uid],
-        'isGroup': False,
-        'lastUpdated': datetime.utcnow()
-    })
-    return jsonify({'chatId': chat_ref.id}), 201
+    # 1-1 chats live at a deterministic id, so this is a single document read
+    chat_id, created = get_or_create_direct_chat(db, uid, friend_uid)
+    return jsonify({'chatId': chat_id}), 201 if created else 200
+
+@chat_bp.route('/chats/typing-metrics', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def typing_metrics():
+    """Typing indicator traffic for this process (received vs. broadcast)"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    uid = _get_user_uid(request)
+    if not uid:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify({'typing': typing_tracker.metrics()}), 200
 
 
 # ============= SOCKET.IO EVENT HANDLERS =============
@@ -296,15 +604,42 @@ def chat_with_user(friend_uid):
 def init_socketio_events(socketio):
     """Initialize Socket.IO event handlers"""
     
+    def _register_presence(uid):
+        """Attach this socket to uid's presence and personal room (once per sid)"""
+        if presence_registry.is_known(request.sid):
+            return
+        join_room(user_room(uid))
+        friends = load_friend_uids(firestore.client(), uid)
+        if presence_registry.connect(request.sid, uid, friends):
+            broadcast_presence(socketio, uid)
+
     @socketio.on('connect')
     def handle_connect(auth_data=None):
-        """Handle client connection"""
+        """Handle client connection (io(url, {auth: {token}}) registers presence)"""
         print(f"Client connected: {request.sid}")
+        token = (auth_data or {}).get('token') if isinstance(auth_data, dict) else None
+        if token:
+            uid = _get_user_uid_from_token(token)
+            if uid:
+                try:
+                    _register_presence(uid)
+                except Exception as e:
+                    print(f"Error registering presence: {str(e)}")
     
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle client disconnection"""
         print(f"Client disconnected: {request.sid}")
+        uid, went_offline = presence_registry.disconnect(request.sid)
+        if went_offline:
+            broadcast_presence(socketio, uid)
+            presence_registry.forget_friends(uid)
+        for chat_id, uid in typing_tracker.forget_sid(request.sid):
+            socketio.emit('user_typing', {
+                'chatId': chat_id,
+                'userId': uid,
+                'isTyping': False
+            }, room=f'chat_{chat_id}')
     
     @socketio.on('join_chat')
     def handle_join_chat(data):
@@ -328,6 +663,7 @@ def init_socketio_events(socketio):
                 return
             
             print(f"✅ User authenticated: {uid}")
+            _register_presence(uid)
             
             # Verify user is participant in this chat
             db = firestore.client()
@@ -338,7 +674,7 @@ def init_socketio_events(socketio):
                 return
             
             chat_data = chat_doc.to_dict()
-            if uid not in chat_data.get('participants', []):
+            if not is_member(db, chat_id, chat_data, uid):
                 print(f"❌ User {uid} not authorized for chat {chat_id}")
                 emit('error', {'message': 'Not authorized for this chat'})
                 return
@@ -380,10 +716,37 @@ def init_socketio_events(socketio):
         except Exception as e:
             print(f"Error in leave_chat: {str(e)}")
     
+    @socketio.on('mark_read')
+    def handle_mark_read(data):
+        """Handle user reading a chat; broadcasts a read receipt to the room"""
+        try:
+            chat_id = data.get('chatId')
+            token = data.get('token')
+            if not chat_id or not token:
+                return
+
+            uid = _get_user_uid_from_token(token)
+            if not uid:
+                emit('error', {'message': 'Invalid token'})
+                return
+
+            receipt = mark_chat_read(firestore.client(), chat_id, uid)
+            if receipt is None:
+                emit('error', {'message': 'Not authorized for this chat'})
+                return
+
+            emit('read_receipt', receipt, room=f'chat_{chat_id}')
+
+        except Exception as e:
+            print(f"Error in mark_read: {str(e)}")
+
     @socketio.on('typing_start')
     def handle_typing_start(data):
-        """Handle user started typing"""
+        """Handle user started typing (only broadcast on a real transition)"""
         try:
+            if not typing_tracker.allow(request.sid):
+                return
+
             chat_id = data.get('chatId')
             token = data.get('token')
             
@@ -393,6 +756,9 @@ def init_socketio_events(socketio):
             uid = _get_user_uid_from_token(token)
             if not uid:
                 return
+
+            if not typing_tracker.start(request.sid, chat_id, uid):
+                return
             
             db = firestore.client()
             user_name = _get_display_name(db, uid)
@@ -400,6 +766,7 @@ def init_socketio_events(socketio):
             # Broadcast to others in the room (exclude sender)
             room_name = f'chat_{chat_id}'
             emit('user_typing', {
+                'chatId': chat_id,
                 'userId': uid,
                 'userName': user_name,
                 'isTyping': True
@@ -410,8 +777,11 @@ def init_socketio_events(socketio):
     
     @socketio.on('typing_stop')
     def handle_typing_stop(data):
-        """Handle user stopped typing"""
+        """Handle user stopped typing (only broadcast on a real transition)"""
         try:
+            if not typing_tracker.allow(request.sid):
+                return
+
             chat_id = data.get('chatId')
             token = data.get('token')
             
@@ -421,13 +791,22 @@ def init_socketio_events(socketio):
             uid = _get_user_uid_from_token(token)
             if not uid:
                 return
+
+            if not typing_tracker.stop(request.sid, chat_id, uid):
+                return
             
             # Broadcast to others in the room (exclude sender)
             room_name = f'chat_{chat_id}'
             emit('user_typing', {
+                'chatId': chat_id,
                 'userId': uid,
                 'isTyping': False
             }, room=room_name, include_self=False)
             
         except Exception as e:
-            print(f"Error in typing_stop: {str(e)}")
\ No newline at end of file
+            print(f"Error in typing_stop: {str(e)}")
+
+    # Flip quiet typers back to "stopped" without waiting for the client
+    socketio.start_background_task(typing_sweeper, socketio)
+    # Write isOnline/lastSeen behind in batches
+    socketio.start_background_task(presence_flusher, socketio)
@@ -3,10 +3,21 @@ from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from firebase_admin import auth, firestore
 from google.api_core.retry import Retry
-from google.api_core.exceptions import RetryError
+from google.api_core.exceptions import RetryError, NotFound
 from google.cloud import firestore as gcf
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import base64
+import json
 import logging
+from cleanup_jobs import start_job, delete_comment_tree, delete_parent_cascade
+from rsvp_counters import (
+    RSVP_STATUSES, COUNTED_STATUSES, WAITLISTED, MAX_BATCH_EVENTS,
+    set_rsvp, rsvp_summaries, shard_counts, init_seats, resize_seats
+)
+from social_requests import send_push
+from notifications import notify_author
+from data_access import get_docs
 
 # --- Logging setup ---
 logger = logging.getLogger(__name__)
@@ -35,7 +46,91 @@ def _get_uid(req):
 # --- Firestore retry policy ---
 SHORT_RETRY = Retry(initial=1.0, maximum=10.0, multiplier=2.0, deadline=30.0)
 
+# --- Feed helpers ---
+POSTS_PAGE_SIZE = 20
+MAX_POSTS_PAGE = 100
+UNDATED_CURSOR_PREFIX = "u:"  # base64 cursors never contain ':'
+
+
+def _encode_cursor(doc_id, created_at):
+    """Opaque page cursor: the last document's id and createdAt."""
+    raw = json.dumps({"id": doc_id, "t": created_at.isoformat() if created_at else None})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """Returns (doc_id, created_at) or raises ValueError on a malformed cursor."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        created_at = datetime.fromisoformat(data["t"]) if data.get("t") else None
+        return data["id"], created_at
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _start_after_cursor(query, coll_ref, cursor, order_field):
+    """
+    Continue a query after the cursor document. Uses its snapshot so ties on
+    order_field are handled; falls back to the timestamp if it was deleted.
+    """
+    doc_id, ts = _decode_cursor(cursor)
+    snap = coll_ref.document(doc_id).get()
+    if snap.exists:
+        return query.start_after(snap)
+    if ts is None:
+        raise ValueError("Invalid cursor")
+    return query.start_after({order_field: ts})
+
+
+def _author_names(db, uids):
+    """Bulk-load displayName for a page of authors: uid -> name."""
+    refs = [db.collection("users").document(u) for u in set(uids) if u]
+    if not refs:
+        return {}
+    return {
+        snap.id: (snap.to_dict() or {}).get("displayName", "")
+        for snap in get_docs(db, refs, ["displayName"])
+        if snap.exists
+    }
+
+
+def parse_event_date(date_filter):
+    """
+    Timestamp stored as eventDate for a dateFilter string (ISO date/datetime).
+    None for events without a parseable date: they are stored with a null
+    eventDate and listed with the upcoming events, never archived.
+    """
+    if date_filter:
+        try:
+            return datetime.fromisoformat(str(date_filter).replace("Z", "+00:00"))
+        except ValueError:
+            logger.debug("Unparseable dateFilter %r", date_filter)
+    return None
+
+
+def _parse_capacity(value):
+    """None (unlimited) or a positive int; raises ValueError otherwise."""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError("capacity must be a positive integer")
+    return value
+
+
+def _counter_ref(db, name):
+    """Maintained collection counters: counters/{name}.count"""
+    return db.collection("counters").document(name)
+
 # --- Comment helpers ---
+COMMENTS_PAGE_SIZE = 20
+MAX_COMMENTS_PAGE = 30   # one parallel reply-preview query per top-level comment
+REPLY_PREVIEW = 3
+MAX_REPLIES_PAGE = 50
+
+# Per-thread reply previews for a comment page are fetched concurrently
+_reply_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="replies")
+
+
 def _comments_ref(db, parent_type: str, parent_id: str):
     """
     parent_type: 'posts' or 'events'
@@ -44,24 +139,125 @@ def _comments_ref(db, parent_type: str, parent_id: str):
     return db.collection(parent_type).document(parent_id).collection("comments")
 
 
-def _delete_comment_tree(db, parent_type: str, parent_id: str, comment_id: str):
+def _adjust_reply_count(col, comment_id, delta):
+    """Keep a comment's replyCount (visible direct replies) in step."""
+    if not comment_id:
+        return
+    try:
+        col.document(comment_id).update({"replyCount": firestore.Increment(delta)})
+    except NotFound:
+        logger.debug("Parent comment %s already gone; replyCount not adjusted", comment_id)
+
+
+def _comment_out(snap, names):
+    d = snap.to_dict()
+    d["id"] = snap.id
+    d["authorName"] = names.get(d.get("author", ""), "")
+    return d
+
+
+def _page_args():
+    """(limit, cursor, preview) for the threaded comment endpoints."""
+    limit = max(min(int(request.args.get("limit", COMMENTS_PAGE_SIZE)), MAX_COMMENTS_PAGE), 1)
+    preview = max(min(int(request.args.get("replies", REPLY_PREVIEW)), MAX_REPLIES_PAGE), 0)
+    return limit, request.args.get("cursor"), preview
+
+
+def _threaded_comments(db, parent_type, parent_id, limit, cursor, preview, include_deleted):
+    """
+    One page of top-level comments, each with replyCount and its first
+    `preview` replies. Each thread's preview is its own limit(preview) query,
+    run in parallel, so a page costs at most limit * preview reply reads
+    however long the threads are.
+    """
+    col = _comments_ref(db, parent_type, parent_id)
+    query = col.where("parentCommentId", "==", None) \
+        .order_by("createdAt", direction=firestore.Query.ASCENDING)
+    if cursor:
+        query = _start_after_cursor(query, col, cursor, "createdAt")
+    tops = list(query.limit(limit).stream(retry=SHORT_RETRY, timeout=30.0))
+
+    # replyCount is missing on comments written before it was maintained
+    with_replies = [t.id for t in tops if t.to_dict().get("replyCount", 1) > 0]
+    replies = []
+    if preview and with_replies:
+        def first_replies(comment_id):
+            return list(
+                col.where("parentCommentId", "==", comment_id)
+                .order_by("createdAt", direction=firestore.Query.ASCENDING)
+                .limit(preview)
+                .stream(retry=SHORT_RETRY, timeout=30.0)
+            )
+        for thread in _reply_executor.map(first_replies, with_replies):
+            replies += thread
+
+    names = _author_names(db, [c.to_dict().get("author", "") for c in tops + replies])
+
+    by_parent = {}
+    for r in replies:
+        rd = r.to_dict()
+        if not include_deleted and rd.get("deleted") is True:
+            continue
+        bucket = by_parent.setdefault(rd.get("parentCommentId"), [])
+        if len(bucket) < preview:
+            bucket.append(_comment_out(r, names))
+
+    out = []
+    for t in tops:
+        d = _comment_out(t, names)
+        shown = by_parent.get(t.id, [])
+        reply_count = d.get("replyCount", len(shown))
+        # keep deleted parents as placeholders while they still have replies
+        if not include_deleted and d.get("deleted") is True and not reply_count:
+            continue
+        d["replyCount"] = reply_count
+        d["replies"] = shown
+        d["hasMoreReplies"] = reply_count > len(shown)
+        out.append(d)
+
+    next_cursor = None
+    if len(tops) == limit:
+        next_cursor = _encode_cursor(tops[-1].id, tops[-1].to_dict().get("createdAt"))
+    return out, next_cursor
+
+
+def _comment_replies(db, parent_type, parent_id, comment_id, limit, cursor, include_deleted):
+    """A page of direct replies to one comment (load-more for threads)."""
+    col = _comments_ref(db, parent_type, parent_id)
+    query = col.where("parentCommentId", "==", comment_id) \
+        .order_by("createdAt", direction=firestore.Query.ASCENDING)
+    if cursor:
+        query = _start_after_cursor(query, col, cursor, "createdAt")
+    snaps = list(query.limit(limit).stream(retry=SHORT_RETRY, timeout=30.0))
+    names = _author_names(db, [s.to_dict().get("author", "") for s in snaps])
+    out = []
+    for s in snaps:
+        d = _comment_out(s, names)
+        if not include_deleted and d.get("deleted") is True and not d.get("replyCount"):
+            continue
+        d.setdefault("replyCount", 0)
+        out.append(d)
+    next_cursor = None
+    if len(snaps) == limit:
+        next_cursor = _encode_cursor(snaps[-1].id, snaps[-1].to_dict().get("createdAt"))
+    return out, next_cursor
+
+
+def _delete_comment_tree(db, parent_type: str, parent_id: str, comment_id: str, uid: str):
     """
-    Recursively delete a comment and all of its descendants.
+    Delete a comment now and its descendants in a background job.
+    Returns the cleanup job id.
     """
     logger.debug(
         "Hard-deleting comment tree: type=%s parent=%s comment=%s",
         parent_type, parent_id, comment_id
     )
     col = _comments_ref(db, parent_type, parent_id)
-
-    # delete children first
-    children = col.where("parentCommentId", "==", comment_id).stream()
-    for ch in children:
-        _delete_comment_tree(db, parent_type, parent_id, ch.id)
-
-    # finally delete this node
     col.document(comment_id).delete()
-    logger.debug("Deleted comment doc: %s", comment_id)
+    return start_job(
+        db, uid, "commentTree", f"{parent_type}/{parent_id}/comments/{comment_id}",
+        lambda db, deleter: delete_comment_tree(db, col, comment_id, deleter, include_root=False)
+    )
 
 # =====================================================================
 #                               POSTS
@@ -80,30 +276,43 @@ def posts():
     db = firestore.client()
 
     if request.method == "GET":
-        # List all posts (newest first)
+        # One page of posts (newest first): ?limit=20&cursor=<nextCursor>
         try:
-            snaps = (
-                db.collection("posts")
-                .order_by("createdAt", direction=firestore.Query.DESCENDING)
-                .stream(retry=SHORT_RETRY, timeout=30.0)
-            )
+            limit = max(min(int(request.args.get("limit", POSTS_PAGE_SIZE)), MAX_POSTS_PAGE), 1)
+        except ValueError:
+            return jsonify({"error": "Invalid limit"}), 400
+
+        coll = db.collection("posts")
+        query = coll.order_by("createdAt", direction=firestore.Query.DESCENDING)
+        cursor = request.args.get("cursor")
+        if cursor:
+            try:
+                query = _start_after_cursor(query, coll, cursor, "createdAt")
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+
+        try:
+            snaps = list(query.limit(limit).stream(retry=SHORT_RETRY, timeout=30.0))
         except RetryError:
             return jsonify({"error": "Try again later"}), 503
 
+        # Attach author displayName, one bulk read per page
+        names = _author_names(db, [s.to_dict().get("author", "") for s in snaps])
         out = []
         for s in snaps:
             d = s.to_dict()
             d["id"] = s.id
-            # Attach author displayName
-            user_snap = db.collection("users").document(d.get("author", "")).get()
-            if user_snap.exists:
-                user_data = user_snap.to_dict()
-                d["authorName"] = user_data.get("displayName", "")
-            else:
-                d["authorName"] = ""
+            d["authorName"] = names.get(d.get("author", ""), "")
             out.append(d)
 
-        return jsonify({"posts": out}), 200
+        next_cursor = None
+        if len(snaps) == limit:
+            next_cursor = _encode_cursor(snaps[-1].id, snaps[-1].to_dict().get("createdAt"))
+
+        counter = _counter_ref(db, "posts").get()
+        total = counter.to_dict().get("count") if counter.exists else None
+
+        return jsonify({"posts": out, "nextCursor": next_cursor, "totalEstimate": total}), 200
 
     # Create a post
     data = request.json or {}
@@ -121,7 +330,10 @@ def posts():
         "createdAt": datetime.utcnow(),
     }
     ref = db.collection("posts").document()
-    ref.set(post)
+    batch = db.batch()
+    batch.set(ref, post)
+    batch.set(_counter_ref(db, "posts"), {"count": firestore.Increment(1)}, merge=True)
+    batch.commit()
     logger.debug("Created post id=%s author=%s", ref.id, uid)
     return jsonify({"postId": ref.id}), 201
 
@@ -161,13 +373,15 @@ def edit_or_delete_post(post_id):
             logger.debug("Updated post %s fields=%s", post_id, list(update_fields.keys()))
         return jsonify({"success": True}), 200
 
-    # DELETE post
-    # (If you want to also delete its comments, uncomment the block below.)
-    # for c in ref.collection("comments").stream():
-    #     _delete_comment_tree(db, "posts", post_id, c.id)
-    ref.delete()
-    logger.debug("Deleted post %s", post_id)
-    return jsonify({"success": True}), 200
+    # DELETE post; comments and reactions are cleaned up in the background
+    batch = db.batch()
+    batch.delete(ref)
+    batch.set(_counter_ref(db, "posts"), {"count": firestore.Increment(-1)}, merge=True)
+    batch.commit()
+    job_id = start_job(db, uid, "postCascade", f"posts/{post_id}",
+                       delete_parent_cascade, "posts", post_id)
+    logger.debug("Deleted post %s (cleanup job %s)", post_id, job_id)
+    return jsonify({"success": True, "jobId": job_id}), 200
 
 
 @posts_bp.route("/posts/<post_id>/comments", methods=["GET", "POST", "OPTIONS"])
@@ -184,6 +398,17 @@ def post_comments(post_id):
 
     if request.method == "GET":
         include_deleted = request.args.get("include_deleted", "false").lower() == "true"
+        if request.args.get("threaded", "false").lower() == "true":
+            try:
+                limit, cursor, preview = _page_args()
+                out, next_cursor = _threaded_comments(
+                    db, "posts", post_id, limit, cursor, preview, include_deleted)
+            except ValueError:
+                return jsonify({"error": "Invalid limit, replies or cursor"}), 400
+            except RetryError:
+                return jsonify({"error": "Try again later"}), 503
+            return jsonify({"comments": out, "nextCursor": next_cursor}), 200
+
         try:
             snaps = (
                 db.collection("posts")
@@ -195,19 +420,12 @@ def post_comments(post_id):
         except RetryError:
             return jsonify({"error": "Try again later"}), 503
 
-        out = []
-        for s in snaps:
-            d = s.to_dict()
-            if not include_deleted and d.get("deleted") is True:
-                continue  # hide soft-deleted comments by default
-            d["id"] = s.id
-            auth_snap = db.collection("users").document(d.get("author", "")).get()
-            if auth_snap.exists:
-                ad = auth_snap.to_dict()
-                d["authorName"] = ad.get("displayName", "")
-            else:
-                d["authorName"] = ""
-            out.append(d)
+        snaps = [
+            sn for sn in snaps
+            if include_deleted or sn.to_dict().get("deleted") is not True  # hide soft-deleted by default
+        ]
+        names = _author_names(db, [sn.to_dict().get("author", "") for sn in snaps])
+        out = [_comment_out(sn, names) for sn in snaps]
 
         return jsonify({"comments": out}), 200
 
@@ -222,19 +440,53 @@ def post_comments(post_id):
         "author": uid,
         "text": text,
         "parentCommentId": parent,
+        "replyCount": 0,
         "createdAt": datetime.utcnow(),
     }
-    cref = (
-        db.collection("posts")
-        .document(post_id)
-        .collection("comments")
-        .document()
-    )
-    cref.set(c)
+    col = _comments_ref(db, "posts", post_id)
+    cref = col.document()
+    if parent:
+        # reply + parent's replyCount in one atomic batch
+        if not col.document(parent).get().exists:
+            return jsonify({"error": "Parent comment not found"}), 404
+        batch = db.batch()
+        batch.set(cref, c)
+        batch.update(col.document(parent), {"replyCount": firestore.Increment(1)})
+        batch.commit()
+    else:
+        cref.set(c)
     logger.debug("Created comment %s on post %s by %s", cref.id, post_id, uid)
+    ids = {"postId": post_id, "commentId": cref.id}
+    notify_author(f"posts/{post_id}", "comment", uid, "post", post_id, data=ids)
+    if parent:
+        notify_author(f"posts/{post_id}/comments/{parent}", "reply", uid, "comment", parent, data=ids)
     return jsonify({"commentId": cref.id}), 201
 
 
+@posts_bp.route("/posts/<post_id>/comments/<comment_id>/replies", methods=["GET", "OPTIONS"])
+@cross_origin()
+def post_comment_replies(post_id, comment_id):
+    """Load more replies for one thread: ?limit=20&cursor=<nextCursor>"""
+    if request.method == "OPTIONS":
+        return jsonify({}), 200
+
+    uid = _get_uid(request)
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    db = firestore.client()
+    include_deleted = request.args.get("include_deleted", "false").lower() == "true"
+    try:
+        limit = max(min(int(request.args.get("limit", COMMENTS_PAGE_SIZE)), MAX_REPLIES_PAGE), 1)
+        out, next_cursor = _comment_replies(
+            db, "posts", post_id, comment_id, limit, request.args.get("cursor"), include_deleted)
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    except RetryError:
+        return jsonify({"error": "Try again later"}), 503
+    return jsonify({"replies": out, "nextCursor": next_cursor}), 200
+
+
 @posts_bp.route("/posts/<post_id>/comments/<comment_id>", methods=["PUT", "DELETE", "OPTIONS"])
 @cross_origin()
 def edit_or_delete_post_comment(post_id, comment_id):
@@ -261,6 +513,8 @@ def edit_or_delete_post_comment(post_id, comment_id):
         if not new_text:
             return jsonify({"error": "Text required"}), 400
         cref.update({"text": new_text, "updatedAt": datetime.utcnow(), "deleted": gcf.DELETE_FIELD})
+        if data.get("deleted") is True:
+            _adjust_reply_count(_comments_ref(db, "posts", post_id), data.get("parentCommentId"), 1)
         logger.debug("Edited comment %s on post %s", comment_id, post_id)
         return jsonify({"success": True}), 200
 
@@ -279,10 +533,15 @@ def edit_or_delete_post_comment(post_id, comment_id):
             "deleted": True,
             "updatedAt": datetime.utcnow()
         })
+        if data.get("deleted") is not True:
+            _adjust_reply_count(_comments_ref(db, "posts", post_id), data.get("parentCommentId"), -1)
         logger.debug("Soft-deleted comment %s on post %s", comment_id, post_id)
     else:
-        _delete_comment_tree(db, "posts", post_id, comment_id)
+        job_id = _delete_comment_tree(db, "posts", post_id, comment_id, uid)
+        if data.get("deleted") is not True:
+            _adjust_reply_count(_comments_ref(db, "posts", post_id), data.get("parentCommentId"), -1)
         logger.debug("Hard-deleted comment %s on post %s", comment_id, post_id)
+        return jsonify({"success": True, "jobId": job_id}), 200
 
     return jsonify({"success": True}), 200
 
@@ -304,50 +563,76 @@ def events():
     db = firestore.client()
 
     if request.method == "GET":
-        # Pagination params
-        limit = min(int(request.args.get("limit", 100)), 500)
-        after = request.args.get("after")  # ISO timestamp
-
-        query = db.collection("events")
-        if after:
-            try:
-                dt = datetime.fromisoformat(after)
-                query = query.where("createdAt", "<", dt)
-            except ValueError:
-                return jsonify({"error": "Invalid after timestamp"}), 400
+        # Pagination params: ?limit=100&cursor=<nextCursor>&past=true
+        try:
+            limit = max(min(int(request.args.get("limit", 100)), 500), 1)
+        except ValueError:
+            return jsonify({"error": "Invalid limit"}), 400
+        past = request.args.get("past", "false").lower() == "true"
+        include_rsvps = "rsvps" in request.args.get("include", "").split(",")
+        if include_rsvps:
+            # the caller's RSVP docs are one read per event: same cap as /events/rsvp-summary
+            limit = min(limit, MAX_BATCH_EVENTS)
+
+        # Upcoming events soonest first; the archive (past=true) newest first.
+        # Filtering happens in Firestore so every page comes back full.
+        now = datetime.utcnow()
+        coll = db.collection("events")
+        # Undated events (null eventDate) never expire: they follow the dated
+        # upcoming ones, newest first, and have their own cursor
+        undated = coll.where("eventDate", "==", None) \
+            .order_by("createdAt", direction=firestore.Query.DESCENDING)
+        if past:
+            query = coll.where("eventDate", "<", now) \
+                .order_by("eventDate", direction=firestore.Query.DESCENDING)
+        else:
+            query = coll.where("eventDate", ">=", now) \
+                .order_by("eventDate", direction=firestore.Query.ASCENDING)
 
-        query = query.order_by("createdAt", direction=firestore.Query.DESCENDING).limit(limit)
+        cursor = request.args.get("cursor")
+        in_undated = not past and bool(cursor) and cursor.startswith(UNDATED_CURSOR_PREFIX)
+        try:
+            if in_undated:
+                query = _start_after_cursor(undated, coll, cursor[len(UNDATED_CURSOR_PREFIX):], "createdAt")
+            elif cursor:
+                query = _start_after_cursor(query, coll, cursor, "eventDate")
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
 
         try:
-            snaps = query.stream(retry=SHORT_RETRY, timeout=30.0)
+            snaps = list(query.limit(limit).stream(retry=SHORT_RETRY, timeout=30.0))
+            if not past and not in_undated and len(snaps) < limit:
+                # dated upcoming events ran out: fill the page with undated ones
+                snaps += list(undated.limit(limit - len(snaps)).stream(retry=SHORT_RETRY, timeout=30.0))
         except RetryError:
             return jsonify({"error": "Try again later"}), 503
 
+        names = _author_names(db, [s.to_dict().get("author", "") for s in snaps])
+        # ?include=rsvps: tallies come from the rolled-up rsvpCounts on the docs we
+        # already have; the caller's status is one extra get_all
+        summaries = {}
+        if include_rsvps and snaps:
+            summaries = rsvp_summaries(db, [s.id for s in snaps], uid,
+                                       events={s.id: s.to_dict() for s in snaps})
         out = []
-        now = datetime.utcnow()
         for s in snaps:
             d = s.to_dict()
             d["id"] = s.id
+            d["authorName"] = names.get(d.get("author", ""), "")
+            if summaries:
+                d["rsvpCounts"] = summaries[s.id]["counts"]
+                d["myRsvp"] = summaries[s.id]["myStatus"]
+            out.append(d)
 
-            # Archive logic (hide past events if dateFilter is present)
-            event_date_str = d.get("dateFilter")
-            if event_date_str:
-                try:
-                    event_date = datetime.fromisoformat(event_date_str)
-                except Exception:
-                    event_date = None
-                if event_date and event_date < (now - timedelta(days=0)):
-                    continue
-
-            user_snap = db.collection("users").document(d.get("author", "")).get()
-            if user_snap.exists:
-                ud = user_snap.to_dict()
-                d["authorName"] = ud.get("displayName", "")
+        next_cursor = None
+        if len(snaps) == limit:
+            last = snaps[-1].to_dict()
+            if last.get("eventDate") is None:
+                next_cursor = UNDATED_CURSOR_PREFIX + _encode_cursor(snaps[-1].id, last.get("createdAt"))
             else:
-                d["authorName"] = ""
-            out.append(d)
+                next_cursor = _encode_cursor(snaps[-1].id, last.get("eventDate"))
 
-        return jsonify({"events": out}), 200
+        return jsonify({"events": out, "nextCursor": next_cursor}), 200
 
     # Create event
     data = request.json or {}
@@ -358,19 +643,31 @@ def events():
     photos = data.get("photos") or []
     if not title:
         return jsonify({"error": "Title required"}), 400
+    try:
+        capacity = _parse_capacity(data.get("capacity"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    now = datetime.utcnow()
     ev = {
         "author": uid,
         "title": title,
         "description": description,
         "dateFilter": dateFilter,
+        "eventDate": parse_event_date(dateFilter),
         "location": location,
         "photos": photos,
-        "createdAt": datetime.utcnow(),
+        "capacity": capacity,
+        "rsvpCounts": {s: 0 for s in COUNTED_STATUSES},
+        "createdAt": now,
     }
     ref = db.collection("events").document()
-    ref.set(ev)
-    logger.debug("Created event id=%s author=%s", ref.id, uid)
+    batch = db.batch()
+    batch.set(ref, ev)
+    if capacity:
+        init_seats(batch, ref, capacity)
+    batch.commit()
+    logger.debug("Created event id=%s author=%s capacity=%s", ref.id, uid, capacity)
     return jsonify({"eventId": ref.id}), 201
 
 
@@ -403,23 +700,44 @@ def edit_or_delete_event(event_id):
             update_fields["description"] = (update["description"] or "").strip()
         if "dateFilter" in update:
             update_fields["dateFilter"] = update["dateFilter"]
+            update_fields["eventDate"] = parse_event_date(update["dateFilter"])
         if "location" in update:
             update_fields["location"] = (update["location"] or "").strip()
         if "photos" in update:
             update_fields["photos"] = update["photos"]
+        if "capacity" in update:
+            # capacity is resized through the seat pool, not a plain field write
+            try:
+                capacity = _parse_capacity(update["capacity"])
+                if capacity is None:
+                    raise ValueError("capacity cannot be removed once set")
+                seated = 0
+                if not data.get("capacity"):
+                    seated = shard_counts(db, [event_id])[event_id]["yes"]
+                promoted = resize_seats(db, ref, capacity, seated_now=seated)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            for promoted_uid in promoted:
+                send_push(
+                    promoted_uid,
+                    title="You're in!",
+                    body=f"A spot opened up for {data.get('title', 'an event')}",
+                    data={"eventId": event_id}
+                )
+            if promoted:
+                logger.debug("Promoted %d waiters on event %s", len(promoted), event_id)
         if update_fields:
             update_fields["updatedAt"] = datetime.utcnow()
             ref.update(update_fields)
             logger.debug("Updated event %s fields=%s", event_id, list(update_fields.keys()))
         return jsonify({"success": True}), 200
 
-    # DELETE event
-    # (If you want to also delete its comments, uncomment the block below.)
-    # for c in ref.collection("comments").stream():
-    #     _delete_comment_tree(db, "events", event_id, c.id)
+    # DELETE event; comments, RSVPs and reactions are cleaned up in the background
     ref.delete()
-    logger.debug("Deleted event %s", event_id)
-    return jsonify({"success": True}), 200
+    job_id = start_job(db, uid, "eventCascade", f"events/{event_id}",
+                       delete_parent_cascade, "events", event_id)
+    logger.debug("Deleted event %s (cleanup job %s)", event_id, job_id)
+    return jsonify({"success": True, "jobId": job_id}), 200
 
 
 @events_bp.route("/events/<event_id>/comments", methods=["GET", "POST", "OPTIONS"])
@@ -436,6 +754,17 @@ def event_comments(event_id):
 
     if request.method == "GET":
         include_deleted = request.args.get("include_deleted", "false").lower() == "true"
+        if request.args.get("threaded", "false").lower() == "true":
+            try:
+                limit, cursor, preview = _page_args()
+                out, next_cursor = _threaded_comments(
+                    db, "events", event_id, limit, cursor, preview, include_deleted)
+            except ValueError:
+                return jsonify({"error": "Invalid limit, replies or cursor"}), 400
+            except RetryError:
+                return jsonify({"error": "Try again later"}), 503
+            return jsonify({"comments": out, "nextCursor": next_cursor}), 200
+
         snaps = (
             db.collection("events")
             .document(event_id)
@@ -443,19 +772,12 @@ def event_comments(event_id):
             .order_by("createdAt", direction=firestore.Query.ASCENDING)
             .stream(retry=SHORT_RETRY, timeout=30.0)
         )
-        out = []
-        for s in snaps:
-            d = s.to_dict()
-            if not include_deleted and d.get("deleted") is True:
-                continue
-            d["id"] = s.id
-            auth_snap = db.collection("users").document(d.get("author", "")).get()
-            if auth_snap.exists:
-                ad = auth_snap.to_dict()
-                d["authorName"] = ad.get("displayName", "")
-            else:
-                d["authorName"] = ""
-            out.append(d)
+        snaps = [
+            sn for sn in snaps
+            if include_deleted or sn.to_dict().get("deleted") is not True
+        ]
+        names = _author_names(db, [sn.to_dict().get("author", "") for sn in snaps])
+        out = [_comment_out(sn, names) for sn in snaps]
 
         return jsonify({"comments": out}), 200
 
@@ -470,19 +792,53 @@ def event_comments(event_id):
         "author": uid,
         "text": text,
         "parentCommentId": parent,
+        "replyCount": 0,
         "createdAt": datetime.utcnow(),
     }
-    cref = (
-        db.collection("events")
-        .document(event_id)
-        .collection("comments")
-        .document()
-    )
-    cref.set(c)
+    col = _comments_ref(db, "events", event_id)
+    cref = col.document()
+    if parent:
+        # reply + parent's replyCount in one atomic batch
+        if not col.document(parent).get().exists:
+            return jsonify({"error": "Parent comment not found"}), 404
+        batch = db.batch()
+        batch.set(cref, c)
+        batch.update(col.document(parent), {"replyCount": firestore.Increment(1)})
+        batch.commit()
+    else:
+        cref.set(c)
     logger.debug("Created comment %s on event %s by %s", cref.id, event_id, uid)
+    ids = {"eventId": event_id, "commentId": cref.id}
+    notify_author(f"events/{event_id}", "comment", uid, "event", event_id, data=ids)
+    if parent:
+        notify_author(f"events/{event_id}/comments/{parent}", "reply", uid, "comment", parent, data=ids)
     return jsonify({"commentId": cref.id}), 201
 
 
+@events_bp.route("/events/<event_id>/comments/<comment_id>/replies", methods=["GET", "OPTIONS"])
+@cross_origin()
+def event_comment_replies(event_id, comment_id):
+    """Load more replies for one thread: ?limit=20&cursor=<nextCursor>"""
+    if request.method == "OPTIONS":
+        return jsonify({}), 200
+
+    uid = _get_uid(request)
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    db = firestore.client()
+    include_deleted = request.args.get("include_deleted", "false").lower() == "true"
+    try:
+        limit = max(min(int(request.args.get("limit", COMMENTS_PAGE_SIZE)), MAX_REPLIES_PAGE), 1)
+        out, next_cursor = _comment_replies(
+            db, "events", event_id, comment_id, limit, request.args.get("cursor"), include_deleted)
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    except RetryError:
+        return jsonify({"error": "Try again later"}), 503
+    return jsonify({"replies": out, "nextCursor": next_cursor}), 200
+
+
 @events_bp.route("/events/<event_id>/comments/<comment_id>", methods=["PUT", "DELETE", "OPTIONS"])
 @cross_origin()
 def edit_or_delete_event_comment(event_id, comment_id):
@@ -509,6 +865,8 @@ def edit_or_delete_event_comment(event_id, comment_id):
         if not new_text:
             return jsonify({"error": "Text required"}), 400
         cref.update({"text": new_text, "updatedAt": datetime.utcnow(), "deleted": gcf.DELETE_FIELD})
+        if data.get("deleted") is True:
+            _adjust_reply_count(_comments_ref(db, "events", event_id), data.get("parentCommentId"), 1)
         logger.debug("Edited comment %s on event %s", comment_id, event_id)
         return jsonify({"success": True}), 200
 
@@ -527,10 +885,15 @@ def edit_or_delete_event_comment(event_id, comment_id):
             "deleted": True,
             "updatedAt": datetime.utcnow()
         })
+        if data.get("deleted") is not True:
+            _adjust_reply_count(_comments_ref(db, "events", event_id), data.get("parentCommentId"), -1)
         logger.debug("Soft-deleted comment %s on event %s", comment_id, event_id)
     else:
-        _delete_comment_tree(db, "events", event_id, comment_id)
+        job_id = _delete_comment_tree(db, "events", event_id, comment_id, uid)
+        if data.get("deleted") is not True:
+            _adjust_reply_count(_comments_ref(db, "events", event_id), data.get("parentCommentId"), -1)
         logger.debug("Hard-deleted comment %s on event %s", comment_id, event_id)
+        return jsonify({"success": True, "jobId": job_id}), 200
 
     return jsonify({"success": True}), 200
 
@@ -551,14 +914,59 @@ def rsvp(event_id):
 
     data = request.json or {}
     status = data.get("status")
-    if status not in ("yes", "no", "maybe"):
+    if status not in RSVP_STATUSES:
         return jsonify({"error": "Invalid status"}), 400
 
     db = firestore.client()
-    ref = db.collection("events").document(event_id).collection("rsvps").document(uid)
-    ref.set({"user": uid, "status": status, "updatedAt": datetime.utcnow()})
-    logger.debug("RSVP %s by %s on event %s", status, uid, event_id)
-    return jsonify({"rsvpId": ref.id}), 200
+    event_ref = db.collection("events").document(event_id)
+    event_snap = event_ref.get()
+    if not event_snap.exists:
+        return jsonify({"error": "Not found"}), 404
+    capacity = event_snap.to_dict().get("capacity")
+
+    # RSVP doc, seat and sharded tally move together in one transaction
+    try:
+        previous, current, promoted = set_rsvp(db, event_ref, uid, status, datetime.utcnow(), capacity)
+    except RuntimeError as e:
+        # seats kept changing under every claim/waitlist attempt
+        logger.warning("RSVP %s by %s on event %s gave up: %s", status, uid, event_id, e)
+        return jsonify({"error": "Try again later"}), 503
+    logger.debug("RSVP %s (was %s) by %s on event %s", current, previous, uid, event_id)
+    if current in ("yes", "maybe") and previous not in ("yes", "maybe"):
+        notify_author(f"events/{event_id}", "rsvp", uid, "event", event_id, data={"eventId": event_id})
+    if promoted:
+        logger.debug("Promoted %s from the waitlist of event %s", promoted, event_id)
+        send_push(
+            promoted,
+            title="You're in!",
+            body=f"A spot opened up for {event_snap.to_dict().get('title', 'an event')}",
+            data={"eventId": event_id}
+        )
+    return jsonify({
+        "rsvpId": uid,
+        "status": current,
+        "previousStatus": previous,
+        "waitlisted": current == WAITLISTED,
+    }), 200
+
+
+@events_bp.route("/events/rsvp-summary", methods=["GET", "OPTIONS"])
+@cross_origin()
+def rsvp_summary():
+    """Counts plus the caller's own status for many events: ?ids=a,b,c"""
+    if request.method == "OPTIONS":
+        return jsonify({}), 200
+
+    uid = _get_uid(request)
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    ids = list(dict.fromkeys(i for i in request.args.get("ids", "").split(",") if i))
+    if len(ids) > MAX_BATCH_EVENTS:
+        return jsonify({"error": f"At most {MAX_BATCH_EVENTS} ids per request"}), 400
+
+    db = firestore.client()
+    return jsonify({"rsvps": rsvp_summaries(db, ids, uid)}), 200
 
 
 @events_bp.route("/events/<event_id>/rsvps", methods=["GET", "OPTIONS"])
@@ -572,16 +980,14 @@ def get_rsvps(event_id):
         return jsonify({"error": "Unauthorized"}), 401
 
     db = firestore.client()
-    snaps = db.collection("events").document(event_id).collection("rsvps").stream()
+    snaps = list(db.collection("events").document(event_id).collection("rsvps").stream())
+    names = _author_names(db, [s.to_dict().get("user", "") for s in snaps])
     out = []
     for s in snaps:
         d = s.to_dict()
         d["id"] = s.id
-        user_snap = db.collection("users").document(d.get("user", "")).get()
-        if user_snap.exists:
-            user_data = user_snap.to_dict()
-            d["userName"] = user_data.get("displayName", "")
-        else:
-            d["userName"] = ""
+        d["userName"] = names.get(d.get("user", ""), "")
         out.append(d)
-    return jsonify({"rsvps": out}), 200
\ No newline at end of file
+    # exact tallies for the full attendee list, not the periodic rollup
+    counts = shard_counts(db, [event_id])[event_id]
+    return jsonify({"rsvps": out, "counts": counts}), 200
\ No newline at end of file
@@ -0,0 +1,150 @@
+# social_graph.py
+# In-memory social graph for "people you may know".
+#
+# uid -> set of friend uids, built from the friendships edges plus who is
+# blocked, which requests are still pending and a projection of every pet
+# profile. Suggestions are friends-of-friends ranked by mutual friends, then
+# pet-profile affinity (matches.calculate_pet_match_score), so a lookup walks
+# O(friends * their friends) in memory and never touches Firestore.
+#
+# respond_request/send_request update the graph in place; a periodic full
+# rebuild (REBUILD_INTERVAL_SECONDS) picks up changes made by other processes.
+
+from firebase_admin import firestore
+from collections import Counter
+from itertools import islice
+from matches import calculate_pet_match_score
+import heapq
+import os
+import threading
+import time
+
+REBUILD_INTERVAL_SECONDS = float(os.environ.get('SOCIAL_GRAPH_REBUILD_SECONDS', 900))
+SUGGESTIONS_PAGE_SIZE = 20
+MAX_SUGGESTIONS_PAGE = 50
+CANDIDATE_POOL = 200       # best-by-mutuals candidates that get an affinity score
+MAX_FANOUT = 1000          # friends of one friend considered (caps celebrity nodes)
+MUTUAL_WEIGHT = 10         # one mutual friend outweighs most pet-profile matches
+
+PET_FIELDS = ('species', 'breed', 'sex', 'colour', 'location')
+
+
+class SocialGraph:
+    """Adjacency lists plus the exclusions and pet data used for suggestions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._adj = {}       # uid -> {friend uid}
+        self._blocked = {}   # uid -> {uids uid blocked or was blocked by}
+        self._pending = {}   # uid -> {uids with a pending request either way}
+        self._pets = {}      # uid -> projected petProfile
+        self.ready = False
+        self.built_at = None
+
+    @staticmethod
+    def _link(index, a, b):
+        index.setdefault(a, set()).add(b)
+        index.setdefault(b, set()).add(a)
+
+    @staticmethod
+    def _unlink(index, a, b):
+        index.get(a, set()).discard(b)
+        index.get(b, set()).discard(a)
+
+    def add_friendship(self, a, b):
+        with self._lock:
+            self._link(self._adj, a, b)
+            self._unlink(self._pending, a, b)
+
+    def add_pending(self, a, b):
+        with self._lock:
+            self._link(self._pending, a, b)
+
+    def clear_pending(self, a, b):
+        with self._lock:
+            self._unlink(self._pending, a, b)
+
+    def block(self, a, b):
+        with self._lock:
+            self._link(self._blocked, a, b)
+            self._unlink(self._adj, a, b)
+            self._unlink(self._pending, a, b)
+
+    def set_pet(self, uid, pet):
+        with self._lock:
+            self._pets[uid] = {k: pet.get(k) for k in PET_FIELDS if pet.get(k)}
+
+    def replace(self, adj, blocked, pending, pets):
+        """Swap in a freshly built graph."""
+        with self._lock:
+            self._adj, self._blocked, self._pending, self._pets = adj, blocked, pending, pets
+            self.ready = True
+            self.built_at = time.time()
+
+    def suggestions(self, uid, limit=SUGGESTIONS_PAGE_SIZE):
+        """[(candidate uid, mutual friends, pet affinity)], best first."""
+        with self._lock:
+            friends = self._adj.get(uid, set())
+            excluded = self._blocked.get(uid, set()) | self._pending.get(uid, set())
+            mutuals = Counter()
+            for f in friends:
+                for fof in islice(self._adj.get(f, ()), MAX_FANOUT):
+                    mutuals[fof] += 1
+            candidates = heapq.nlargest(
+                CANDIDATE_POOL,
+                ((n, c) for c, n in mutuals.items()
+                 if c != uid and c not in friends and c not in excluded),
+            )
+            my_pet = self._pets.get(uid, {})
+            scored = [
+                (c, n, calculate_pet_match_score(my_pet, self._pets.get(c, {})))
+                for n, c in candidates
+            ]
+        scored.sort(key=lambda s: (s[1] * MUTUAL_WEIGHT + s[2], s[1]), reverse=True)
+        return scored[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._adj),
+                'edges': sum(len(v) for v in self._adj.values()) // 2,
+                'ready': self.ready,
+                'builtAt': self.built_at,
+            }
+
+
+social_graph = SocialGraph()
+
+
+def build_graph(db, graph=social_graph):
+    """Full rebuild from friendships, pending requests and users."""
+    adj, blocked, pending, pets = {}, {}, {}, {}
+    for e in db.collection('friendships').select(['uid', 'friend']).stream():
+        d = e.to_dict()
+        SocialGraph._link(adj, d['uid'], d['friend'])
+    pending_q = db.collection('requests').where('status', '==', 'pending')
+    for r in pending_q.select(['from', 'to']).stream():
+        d = r.to_dict()
+        if d.get('from') and d.get('to'):
+            SocialGraph._link(pending, d['from'], d['to'])
+    fields = ['blockedUsers'] + [f'petProfile.{k}' for k in PET_FIELDS]
+    for u in db.collection('users').select(fields).stream():
+        d = u.to_dict() or {}
+        for other in d.get('blockedUsers', []) or []:
+            SocialGraph._link(blocked, u.id, other)
+        pet = d.get('petProfile') or {}
+        if pet:
+            pets[u.id] = {k: pet.get(k) for k in PET_FIELDS if pet.get(k)}
+    graph.replace(adj, blocked, pending, pets)
+    return graph.stats()
+
+
+def graph_rebuilder(socketio, graph=social_graph):
+    """Background task: build now, then rebuild every REBUILD_INTERVAL_SECONDS."""
+    while True:
+        try:
+            stats = build_graph(firestore.client(), graph)
+            print(f"Social graph rebuilt: {stats['users']} users, {stats['edges']} edges")
+        except Exception as e:
+            print(f"Error rebuilding social graph: {str(e)}")
+        socketio.sleep(REBUILD_INTERVAL_SECONDS)
@@ -4,10 +4,15 @@ from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from firebase_admin import auth, firestore
 from datetime import datetime
+from notifications import notify_author
 
 # Define the Blueprint at the top!
 reactions_bp = Blueprint('reactions_bp', __name__)
 
+MAX_SUMMARY_IDS = 100
+# Same set as EMOJIS in the frontend; also used as keys of the summary counts map
+REACTION_TYPES = ('like', 'love', 'haha', 'sad')
+
 def _get_uid(req):
     hdr = req.headers.get('Authorization', '').split()
     if len(hdr) != 2 or hdr[0] != 'Bearer':
@@ -17,6 +22,85 @@ def _get_uid(req):
     except:
         return None
 
+def _summary_ref(db, entityType, entityId):
+    """reactions/{type}_{id} holds the maintained summary: counts by reaction type"""
+    return db.collection('reactions').document(f'{entityType}_{entityId}')
+
+@firestore.transactional
+def _write_reaction(transaction, db, entityType, entityId, uid, rtype, now):
+    """
+    Set uid's reaction to rtype (None removes it) and move the summary counts
+    with it. Reactions live at items/{uid}, so the only read is that one doc:
+    no query, and a repeated request is a no-op. The summary is a blind
+    Increment, so busy posts do not make reaction writes contend.
+    Returns (old_type, new_type).
+    """
+    summary_ref = _summary_ref(db, entityType, entityId)
+    reaction_ref = summary_ref.collection('items').document(uid)
+    snap = reaction_ref.get(transaction=transaction)
+    old_type = snap.to_dict().get('type') if snap.exists else None
+    if old_type == rtype:
+        return old_type, rtype
+
+    # set() takes nested maps, not dotted paths; merge=True merges them per key
+    counts = {}
+    if rtype:
+        counts[rtype] = firestore.Increment(1)
+    if old_type:
+        counts[old_type] = firestore.Increment(-1)
+    summary = {'entityType': entityType, 'entityId': entityId, 'counts': counts}
+    if not (rtype and old_type):
+        summary['total'] = firestore.Increment(1 if rtype else -1)
+    transaction.set(summary_ref, summary, merge=True)
+
+    if not rtype:
+        transaction.delete(reaction_ref)
+    elif snap.exists:
+        transaction.update(reaction_ref, {'type': rtype, 'updatedAt': now})
+    else:
+        transaction.set(reaction_ref, {'user': uid, 'type': rtype, 'createdAt': now})
+    return old_type, rtype
+
+def reaction_summaries(db, entityType, entityIds, uid=None):
+    """{entityId: {'counts': {...}, 'total': n, 'mine': type|None}} from the summary docs"""
+    out = {eid: {'counts': {}, 'total': 0, 'mine': None} for eid in entityIds}
+    refs = [_summary_ref(db, entityType, eid) for eid in entityIds]
+    for snap in (db.get_all(refs) if refs else []):
+        if snap.exists:
+            d = snap.to_dict()
+            eid = d.get('entityId') or snap.id.split('_', 1)[-1]
+            if eid in out:
+                out[eid]['counts'] = {k: v for k, v in (d.get('counts') or {}).items() if v > 0}
+                out[eid]['total'] = d.get('total', 0)
+    if uid:
+        mine = [_summary_ref(db, entityType, eid).collection('items').document(uid) for eid in entityIds]
+        for snap in (db.get_all(mine) if mine else []):
+            if snap.exists:
+                # .../reactions/{type}_{id}/items/{uid}
+                eid = snap.reference.parent.parent.id.split('_', 1)[-1]
+                if eid in out:
+                    out[eid]['mine'] = snap.to_dict().get('type')
+    return out
+
+@reactions_bp.route('/reactions/summary', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def reactions_summary():
+    """Batch summaries for a feed page: ?entityType=post&ids=a,b,c"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    entityType = request.args.get('entityType')
+    ids = list(dict.fromkeys(i for i in request.args.get('ids', '').split(',') if i))
+    if not entityType:
+        return jsonify({'error': 'entityType required'}), 400
+    if len(ids) > MAX_SUMMARY_IDS:
+        return jsonify({'error': f'At most {MAX_SUMMARY_IDS} ids per request'}), 400
+
+    # Public like GET /reactions; the caller's own reaction is added when signed in
+    uid = _get_uid(request)
+    db = firestore.client()
+    return jsonify({'summaries': reaction_summaries(db, entityType, ids, uid)}), 200
+
 @reactions_bp.route('/reactions', methods=['GET', 'POST', 'OPTIONS'])
 @cross_origin()
 def reactions():
@@ -50,27 +134,21 @@ def reactions():
         return jsonify({'error': 'Unauthorized'}), 401
 
     data = request.json or {}
-    rtype = data.get('type')
-    if not rtype:
+    if 'type' not in data and not data.get('remove'):
         return jsonify({'error': 'type required'}), 400
+    # type: null (or "remove": true) takes the reaction back; same type again is a no-op
+    rtype = None if data.get('remove') else data.get('type')
+    if rtype is not None and rtype not in REACTION_TYPES:
+        return jsonify({'error': f"type must be one of {', '.join(REACTION_TYPES)}"}), 400
 
-    # Check for an existing reaction by this user
-    existing = coll.where('user', '==', uid).limit(1).get()
-    now = datetime.utcnow()
-    if existing:
-        # update the existing reaction
-        doc_ref = existing[0].reference
-        doc_ref.update({
-            'type': rtype,
-            'updatedAt': now
-        })
-        return jsonify({'message': 'Reaction updated'}), 200
-    else:
-        # create a new reaction
-        new_ref = coll.document()
-        new_ref.set({
-            'user': uid,
-            'type': rtype,
-            'createdAt': now
-        })
-        return jsonify({'reactionId': new_ref.id}), 201
+    # Reaction and summary counts change together
+    old_type, new_type = _write_reaction(db.transaction(), db, entityType, entityId, uid, rtype, datetime.utcnow())
+    if new_type is None:
+        return jsonify({'message': 'Reaction removed', 'previousType': old_type}), 200
+    if old_type is None:
+        if entityType in ('post', 'event'):
+            collection = 'posts' if entityType == 'post' else 'events'
+            notify_author(f'{collection}/{entityId}', 'reaction', uid, entityType, entityId,
+                          data={f'{entityType}Id': entityId})
+        return jsonify({'reactionId': uid, 'type': new_type}), 201
+    return jsonify({'message': 'Reaction updated', 'reactionId': uid, 'type': new_type, 'previousType': old_type}), 200
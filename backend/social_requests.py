@@ -2,34 +2,50 @@
 
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from firebase_admin import auth, firestore, messaging
+from firebase_admin import auth, firestore
 from datetime import datetime
+from social_chats import get_or_create_direct_chat
+from push_queue import push_queue
+from notifications import notify
+from group_chats import hydrate_users
+from social_graph import social_graph, SUGGESTIONS_PAGE_SIZE, MAX_SUGGESTIONS_PAGE
+from friendships import (
+    FRIENDS_PAGE_SIZE, MAX_FRIENDS_PAGE, add_friendship, remove_friendship, page_friend_uids
+)
 
 requests_bp = Blueprint('requests_bp', __name__)
 
+REQUESTS_PAGE_SIZE = 20
+MAX_REQUESTS_PAGE = 100
+REQUEST_FIELDS = ['from', 'to', 'type', 'status', 'createdAt']
+
 def send_push(to_uid, title, body, data=None):
     """
-    Send an FCM push to a single user.
+    Queue an FCM push to a single user; returns immediately.
     Assumes you store their token in users/{uid}/fcmTokens/{tokenId}.
+    Delivery, batching, retries and dead-token cleanup happen in push_queue.
     """
-    db = firestore.client()
-    tokens = db.collection('users') \
-               .document(to_uid) \
-               .collection('fcmTokens') \
-               .stream()
-    for tk in tokens:
-        token = tk.to_dict().get('token')
-        if not token:
-            continue
-        msg = messaging.Message(
-            notification=messaging.Notification(title=title, body=body),
-            data=data or {},
-            token=token
-        )
-        try:
-            messaging.send(msg)
-        except Exception as e:
-            print("FCM send error:", e)
+    push_queue.enqueue(to_uid, title, body, data)
+
+def _page_requests(db, side, uid, status, limit, cursor=None):
+    """
+    One page of requests where `side` ('to' or 'from') is uid, newest first.
+    The requests collection is the index: needs composite indexes on
+    (to, status, createdAt desc) and (from, status, createdAt desc).
+    Returns (requests, next_cursor); the cursor is the last request id.
+    """
+    col = db.collection('requests')
+    query = col.where(side, '==', uid) \
+               .where('status', '==', status) \
+               .order_by('createdAt', direction=firestore.Query.DESCENDING)
+    if cursor:
+        snap = col.document(cursor).get()
+        if not snap.exists:
+            raise ValueError('Invalid cursor')
+        query = query.start_after(snap)
+    snaps = list(query.select(REQUEST_FIELDS).limit(limit).stream())
+    out = [{**s.to_dict(), 'id': s.id} for s in snaps]
+    return out, (snaps[-1].id if len(snaps) == limit else None)
 
 @requests_bp.route('/send-request', methods=['POST', 'OPTIONS'])
 @cross_origin()
@@ -64,23 +80,13 @@ def send_request():
         'status': 'pending',
         'createdAt': datetime.utcnow()
     }
+    # the requests collection itself is the inbox index (see _page_requests)
     req_ref.set(req)
+    social_graph.add_pending(current_uid, to_uid)
 
-    # update user documents
-    db.collection('users').document(current_uid).update({
-        'outgoingRequests': firestore.ArrayUnion([req_ref.id])
-    })
-    db.collection('users').document(to_uid).update({
-        'incomingRequests': firestore.ArrayUnion([req_ref.id])
-    })
-
-    # send FCM notification
-    send_push(
-        to_uid,
-        title="New Request",
-        body=f"You have a new {req_type} request",
-        data={'requestId': req_ref.id}
-    )
+    # inbox entry; pushed live over the socket, or via FCM when offline
+    notify(to_uid, 'request_received', current_uid, 'request', req_ref.id,
+           data={'requestId': req_ref.id, 'type': req_type})
 
     return jsonify({'message': 'Request sent', 'requestId': req_ref.id}), 201
 
@@ -99,38 +105,70 @@ def list_requests():
     except:
         return jsonify({'error': 'Invalid token'}), 401
 
-    db = firestore.client()
-    user_snap = db.collection('users').document(current_uid).get()
-    user = user_snap.to_dict() or {}
-    inc = user.get('incomingRequests', [])
-    out = user.get('outgoingRequests', [])
-    
-    def fetch(ids):
-        out = []
-        for i in ids:
-            doc = db.collection('requests').document(i).get()
-            if not doc.exists:
-                continue
-            data = doc.to_dict()
-            from_uid = data['from']
-            from_user_doc = db.collection('users').document(from_uid).get()
-            from_user = from_user_doc.to_dict() if from_user_doc.exists else {}
-            pet_name = from_user.get('petProfile', {}).get('name') or from_user.get('displayName') or from_uid
-            avatar = from_user.get('petProfile', {}).get('image')
-            out.append({
-                **data,
-                'id': i,
-                'fromPetName': pet_name,
-                'fromAvatar': avatar
-            })
-        return out
+    try:
+        limit = min(int(request.args.get('limit', REQUESTS_PAGE_SIZE)), MAX_REQUESTS_PAGE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    status = request.args.get('status', 'pending')
 
+    db = firestore.client()
+    try:
+        incoming, incoming_next = _page_requests(db, 'to', current_uid, status, limit,
+                                                 request.args.get('incomingCursor'))
+        outgoing, outgoing_next = _page_requests(db, 'from', current_uid, status, limit,
+                                                 request.args.get('outgoingCursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # one projected get_all for every sender/recipient on both pages
+    users = hydrate_users(db, list({r['from'] for r in incoming + outgoing} |
+                                   {r['to'] for r in incoming + outgoing}))
+
+    def card(uid):
+        user = users.get(uid, {})
+        pet = user.get('petProfile', {})
+        return pet.get('name') or user.get('displayName') or uid, pet.get('image')
+
+    for req in incoming + outgoing:
+        req['fromPetName'], req['fromAvatar'] = card(req['from'])
+        req['toPetName'], req['toAvatar'] = card(req['to'])
 
     return jsonify({
-        'incoming': fetch(inc),
-        'outgoing': fetch(out)
+        'incoming': incoming,
+        'outgoing': outgoing,
+        'incomingNextCursor': incoming_next,
+        'outgoingNextCursor': outgoing_next
     }), 200
 
+@firestore.transactional
+def _respond(transaction, db, request_id, current_uid, action, now):
+    """
+    Apply a response atomically: the request status, and for an accept both
+    friendship edges (for a block, the edges are dropped instead).
+    Returns the request dict, or None if it does not exist; nothing is written
+    when current_uid is not the recipient or the request is no longer pending.
+    """
+    req_ref = db.collection('requests').document(request_id)
+    snap = req_ref.get(transaction=transaction)
+    if not snap.exists:
+        return None
+    req = snap.to_dict()
+    if req['to'] != current_uid or req.get('status') != 'pending':
+        return req
+
+    # a non-pending request drops out of both inboxes
+    transaction.update(req_ref, {'status': action, 'respondedAt': now})
+    if action == 'accept':
+        add_friendship(transaction, db, req['from'], req['to'], now, request_id)
+    elif action == 'block':
+        remove_friendship(transaction, db, req['from'], req['to'])
+        transaction.update(db.collection('users').document(current_uid), {
+            'blockedUsers': firestore.ArrayUnion([req['from']])
+        })
+    return req
+
 @requests_bp.route('/requests/<request_id>/respond', methods=['POST', 'OPTIONS'])
 @cross_origin()
 def respond_request(request_id):
@@ -150,53 +188,37 @@ def respond_request(request_id):
         return jsonify({'error': 'Invalid token'}), 401
 
     db = firestore.client()
-    req_doc = db.collection('requests').document(request_id).get()
-    if not req_doc.exists:
+    req = _respond(db.transaction(), db, request_id, current_uid, action, datetime.utcnow())
+    if req is None:
         return jsonify({'error': 'Request not found'}), 404
-    req = req_doc.to_dict()
     if req['to'] != current_uid:
         return jsonify({'error': 'Not authorized'}), 403
+    if req.get('status') != 'pending':
+        return jsonify({'error': 'Request already answered'}), 409
 
-    # update status
-    db.collection('requests').document(request_id).update({'status': action})
-
-    # remove request from both users
-    db.collection('users').document(req['from']).update({
-        'outgoingRequests': firestore.ArrayRemove([request_id])
-    })
-    db.collection('users').document(req['to']).update({
-        'incomingRequests': firestore.ArrayRemove([request_id])
-    })
-
-    # block?
-    if action == 'block':
-        db.collection('users').document(current_uid).update({
-            'blockedUsers': firestore.ArrayUnion([req['from']])
-        })
+    # keep this process's suggestion graph current (other processes catch up on rebuild)
+    if action == 'accept':
+        social_graph.add_friendship(req['from'], req['to'])
+    elif action == 'block':
+        social_graph.block(current_uid, req['from'])
+    else:
+        social_graph.clear_pending(req['from'], req['to'])
 
-    # accept: create chat
+    # accept: open the 1-1 chat
     if action == 'accept':
-        chat_ref = db.collection('chats').document()
-        chat_ref.set({
-            'participants': [req['from'], req['to']],
-            'isGroup': False,
-            'lastUpdated': datetime.utcnow()
-        })
+        # reuses the pair's existing chat instead of creating a duplicate
+        chat_id, _ = get_or_create_direct_chat(db, req['from'], req['to'])
+        notify(req['from'], 'request_accepted', current_uid, 'request', request_id,
+               data={'requestId': request_id, 'chatId': chat_id})
+    else:
+        # notify requester
         send_push(
             req['from'],
-            title="Request Accepted",
-            body="Your request was accepted! Say hello.",
-            data={'chatId': chat_ref.id}
+            title=f"Request {action.title()}",
+            body=f"Your request was {action}",
+            data={'requestId': request_id}
         )
 
-    # notify requester
-    send_push(
-        req['from'],
-        title=f"Request {action.title()}",
-        body=f"Your request was {action}",
-        data={'requestId': request_id}
-    )
-
     return jsonify({'message': f'Request {action}ed'}), 200
 
 @requests_bp.route('/blocked', methods=['GET', 'OPTIONS'])
@@ -211,7 +233,7 @@ def list_blocked():
     except:
         return jsonify({'error': 'Invalid token'}), 401
     db = firestore.client()
-    user = db.collection('users').document(uid).get().to_dict()
+    user = db.collection('users').document(uid).get(field_paths=['blockedUsers']).to_dict() or {}
     return jsonify({'blocked': user.get('blockedUsers', [])}), 200
 
 @requests_bp.route('/approved-friends', methods=['GET', 'OPTIONS'])
@@ -229,41 +251,68 @@ def approved_friends():
     except Exception:
         return jsonify({'error': 'Invalid token'}), 401
 
+    try:
+        limit = min(int(request.args.get('limit', FRIENDS_PAGE_SIZE)), MAX_FRIENDS_PAGE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
     db = firestore.client()
+    friend_uids, next_cursor = page_friend_uids(db, current_uid, limit, request.args.get('cursor'))
 
-    # Accept any typical "accepted" status for safety
-    ACCEPTED_STATUSES = {'accept', 'accepted', 'approved'}
-
-    # Fetch requests where current user is 'from' or 'to' and status is in ACCEPTED_STATUSES
-    approved_from = db.collection('requests') \
-        .where('from', '==', current_uid).stream()
-    approved_to = db.collection('requests') \
-        .where('to', '==', current_uid).stream()
-
-    friend_uids = set()
-    for r in approved_from:
-        rdata = r.to_dict()
-        if rdata.get('status', '').lower() in ACCEPTED_STATUSES:
-            friend_uids.add(rdata['to'])
-    for r in approved_to:
-        rdata = r.to_dict()
-        if rdata.get('status', '').lower() in ACCEPTED_STATUSES:
-            friend_uids.add(rdata['from'])
-
-    # Fetch friend user display names (petProfile.name preferred)
+    # Friend display names (petProfile.name preferred), one projected get_all
+    users = hydrate_users(db, friend_uids)
     friends = []
     for fid in friend_uids:
-        user_doc = db.collection('users').document(fid).get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            pet_name = user_data.get('petProfile', {}).get('name')
-            display_name = pet_name or user_data.get('displayName') or fid
-            avatarUrl = user_data.get('petProfile', {}).get('image')
-            friends.append({
-                'uid': fid,
-                'displayName': display_name,
-                'avatarUrl': avatarUrl
-            })
-
-    return jsonify({'friends': friends}), 200
+        if fid not in users:
+            continue
+        user_data = users[fid]
+        pet_name = user_data.get('petProfile', {}).get('name')
+        friends.append({
+            'uid': fid,
+            'displayName': pet_name or user_data.get('displayName') or fid,
+            'avatarUrl': user_data.get('petProfile', {}).get('image')
+        })
+
+    return jsonify({'friends': friends, 'nextCursor': next_cursor}), 200
+
+@requests_bp.route('/friend-suggestions', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def friend_suggestions():
+    """People you may know: friends of friends, ranked by mutual friends and pet affinity"""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    token_header = request.headers.get('Authorization', '')
+    parts = token_header.split()
+    if len(parts) != 2 or parts[0] != 'Bearer':
+        return jsonify({'error': 'Missing token'}), 401
+    try:
+        current_uid = auth.verify_id_token(parts[1])['uid']
+    except Exception:
+        return jsonify({'error': 'Invalid token'}), 401
 
+    try:
+        limit = min(int(request.args.get('limit', SUGGESTIONS_PAGE_SIZE)), MAX_SUGGESTIONS_PAGE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    if not social_graph.ready:
+        return jsonify({'error': 'Suggestions are not available yet, try again shortly'}), 503
+
+    ranked = social_graph.suggestions(current_uid, max(limit, 1))
+    users = hydrate_users(firestore.client(), [uid for uid, _, _ in ranked])
+    suggestions = []
+    for uid, mutual, affinity in ranked:
+        if uid not in users:
+            continue
+        user_data = users[uid]
+        suggestions.append({
+            'uid': uid,
+            'displayName': user_data.get('petProfile', {}).get('name') or user_data.get('displayName') or uid,
+            'avatarUrl': user_data.get('petProfile', {}).get('image'),
+            'mutualFriends': mutual,
+            'petAffinity': affinity
+        })
+    return jsonify({'suggestions': suggestions}), 200
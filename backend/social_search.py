@@ -27,6 +27,7 @@ def search_users():
         snaps = db.collection('users')\
                   .where(field, '>=', q)\
                   .where(field, '<=', q + '\uf8ff')\
+                  .select(['displayName', 'email', 'phone'])\
                   .stream()
         for s in snaps:
             d=s.to_dict()
@@ -0,0 +1,63 @@
+# sparse_fields.py
+# ?fields= support for endpoints that return user documents.
+#
+# fields=displayName,petProfile.name,petProfile.image
+# The parsed field paths are handed to Firestore (DocumentReference.get
+# field_paths / Query.select), so only those fields are read, sent over the
+# wire and deserialized; project() trims anything computed on top.
+
+import re
+
+MAX_FIELDS = 30
+_FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
+
+def parse_fields(raw):
+    """
+    'a, b.c' -> ['a', 'b.c']; None when the parameter is absent. Overlapping
+    paths are merged ('a,a.b' -> ['a']) so the result can go straight to
+    Firestore. Raises ValueError.
+    """
+    if raw is None:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    if not fields:
+        raise ValueError('fields must list at least one field')
+    if len(fields) > MAX_FIELDS:
+        raise ValueError(f'At most {MAX_FIELDS} fields')
+    bad = [f for f in fields if not _FIELD_RE.match(f)]
+    if bad:
+        raise ValueError(f'Invalid field: {bad[0]}')
+    return merge_paths(fields)
+
+
+def merge_paths(*groups):
+    """
+    Union of field paths without overlaps (Firestore rejects a projection
+    containing both 'a' and 'a.b'); the shorter path wins.
+    """
+    paths = sorted({p for g in groups if g for p in g}, key=lambda p: (p.count('.'), p))
+    out = []
+    for p in paths:
+        if not any(p == q or p.startswith(q + '.') for q in out):
+            out.append(p)
+    return out
+
+
+def project(data, fields, keep=()):
+    """Keep only the given (possibly dotted) field paths of a dict, plus `keep` keys."""
+    if fields is None:
+        return data
+    out = {k: data[k] for k in keep if k in data}
+    for path in merge_paths(fields):
+        src, dst = data, out
+        parts = path.split('.')
+        for i, part in enumerate(parts):
+            if not isinstance(src, dict) or part not in src:
+                break
+            if i == len(parts) - 1:
+                dst[part] = src[part]
+            else:
+                src = src[part]
+                dst = dst.setdefault(part, {})
+    return out
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from firebase_admin import auth, firestore
+from social_graph import social_graph
 
 update_pet_profile_bp = Blueprint('update_pet_profile_bp', __name__)
 
@@ -50,6 +51,7 @@ def update_pet_profile():
         db.collection('users').document(uid).update({
             'petProfile': pet_profile
         })
+        social_graph.set_pet(uid, pet_profile)
         return jsonify({'message': 'Pet profile updated successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
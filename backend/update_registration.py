@@ -4,9 +4,46 @@ from flask import Blueprint, request, jsonify
 from firebase_admin import auth, firestore
 from flask_cors import cross_origin
 from user_types import ALLOWED_USER_TYPES
+from handle_reservations import HandleTaken, claim_profile, availability
+from data_access import remember
+import threading
+import time
 
 update_registration_bp = Blueprint('update_registration_bp', __name__)
 
+PHONE_CHECKS_PER_MINUTE = 10
+PHONE_CHECK_BURST = 5
+
+
+class _PhoneCheckLimiter:
+    """Token bucket per uid for phone availability lookups."""
+
+    def __init__(self, rate=PHONE_CHECKS_PER_MINUTE / 60.0, burst=PHONE_CHECK_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}   # uid -> (tokens, last refill)
+
+    def allow(self, uid):
+        now = self._clock()
+        with self._lock:
+            tokens, last = self._buckets.get(uid, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                self._buckets[uid] = (tokens, now)
+                return False
+            self._buckets[uid] = (tokens - 1.0, now)
+            return True
+
+
+_phone_checks = _PhoneCheckLimiter()
+
+TAKEN_MESSAGES = {
+    'username': 'Username already taken. Please choose a different one.',
+    'phone': 'Phone number already registered. Please use a different number.',
+}
+
 @update_registration_bp.route('/update-registration', methods=['POST', 'OPTIONS'])
 @cross_origin()
 def update_registration():
@@ -43,17 +80,6 @@ def update_registration():
     db = firestore.client()
     users_ref = db.collection('users')
 
-    # Check for duplicate username or phone
-    existing_user_query = users_ref.where('preferredUsername', '==', data['preferredUsername']).get()
-    for doc in existing_user_query:
-        if doc.id != uid:
-            return jsonify({'error': 'Username already taken. Please choose a different one.'}), 409
-
-    existing_phone_query = users_ref.where('phone', '==', data['phone']).get()
-    for doc in existing_phone_query:
-        if doc.id != uid:
-            return jsonify({'error': 'Phone number already registered. Please use a different number.'}), 409
-
     # Prepare user data to update
     update_data = {
         'firstName': data['firstName'].strip(),
@@ -68,10 +94,45 @@ def update_registration():
 
     # You can also add: 'lastUpdated': firestore.SERVER_TIMESTAMP,
 
-    user_ref = users_ref.document(uid)
-    user_ref.set(update_data, merge=True)
-
-    updated_user = user_ref.get().to_dict()
+    # Username/phone reservations and the profile are written in one transaction,
+    # so concurrent registrations cannot both take the same handle
+    try:
+        updated_user = claim_profile(db.transaction(), db, uid, update_data)
+    except HandleTaken as e:
+        return jsonify({'error': TAKEN_MESSAGES[e.field]}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # the transaction already read the profile, so the result needs no re-read
+    remember(users_ref.document(uid), dict(updated_user))
     updated_user['uid'] = uid  # Always include UID
 
     return jsonify({'success': True, 'user': updated_user}), 200
+
+@update_registration_bp.route('/registration/availability', methods=['GET', 'OPTIONS'])
+@cross_origin()
+def registration_availability():
+    """Live form check: ?username=...&phone=... (the caller's own handles count as available)"""
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    # Signed-in only (the registration flow already has a token), and phone
+    # checks are rate limited per user, so this cannot be used to find out
+    # which phone numbers are registered
+    token_header = request.headers.get('Authorization')
+    if not token_header or not token_header.startswith("Bearer "):
+        return jsonify({'error': 'Missing or invalid token'}), 401
+    try:
+        uid = auth.verify_id_token(token_header.split(" ")[1])['uid']
+    except Exception as e:
+        return jsonify({'error': 'Invalid token: ' + str(e)}), 401
+
+    username = request.args.get('username')
+    phone = request.args.get('phone')
+    if username is None and phone is None:
+        return jsonify({'error': 'username or phone required'}), 400
+    if phone is not None and not _phone_checks.allow(uid):
+        return jsonify({'error': 'Too many phone checks, try again later'}), 429
+
+    db = firestore.client()
+    return jsonify(availability(db, uid, username, phone)), 200
@@ -2,6 +2,9 @@
 from flask import Blueprint, request, jsonify
 from firebase_admin import auth, firestore
 from flask_cors import cross_origin
+from sparse_fields import parse_fields
+from data_access import get_doc, set_doc, remember
+from handle_reservations import HANDLE_FIELDS, HandleTaken, claim_profile
 
 user_profile_bp = Blueprint('user_profile_bp', __name__)
 
@@ -24,8 +27,14 @@ def get_profile():
     uid, error_resp, code = get_authenticated_user_uid(token_header)
     if error_resp: return error_resp, code
 
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     db = firestore.client()
-    doc = db.collection('users').document(uid).get()
+    # ?fields= is pushed down to Firestore so only those fields are read
+    doc = get_doc(db.collection('users').document(uid), fields)
     if doc.exists:
         user = doc.to_dict()
         user['uid'] = uid
@@ -56,7 +65,17 @@ def update_profile():
 
     db = firestore.client()
     user_ref = db.collection('users').document(uid)
-    user_ref.set(update_data, merge=True)
-    user = user_ref.get().to_dict()
+    if any(k in update_data for k in HANDLE_FIELDS):
+        # Username/phone changes claim the new reservation and release the old one
+        try:
+            user = claim_profile(db.transaction(), db, uid, update_data)
+        except HandleTaken as e:
+            return jsonify({'error': f'{e.field.title()} already taken'}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        remember(user_ref, dict(user))
+    else:
+        set_doc(user_ref, update_data, merge=True)
+        user = get_doc(user_ref).to_dict()
     user['uid'] = uid
     return jsonify({'success': True, 'user': user}), 200